@@ -0,0 +1,82 @@
+import os
+import sys
+import threading
+import time
+from PIL import Image
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+# Entry points import this module first, so this is as close to process start as the timings get.
+STARTED = time.perf_counter()
+
+
+def asset_path(name):
+    return os.path.join(ROOT, *name.split('/'))
+
+
+class AssetRegistry:
+    def __init__(self):
+        self.images = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.decode_time = 0
+
+    def image(self, name):
+        image = self.images.get(name)
+        if image is None:
+            with self.lock:
+                image = self.images.get(name)
+                if image is None:
+                    start = time.perf_counter()
+                    image = Image.open(asset_path(name))
+                    # Image.open only reads the header; decode now rather than on the first paste.
+                    image.load()
+                    self.decode_time += time.perf_counter() - start
+                    self.images[name] = image
+        return image
+
+    def prefetch(self, names):
+        names = list(names)
+
+        def load_all():
+            for name in names:
+                self.image(name)
+
+        self.thread = threading.Thread(target=load_all, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+
+class StartupTimer:
+    def __init__(self, start=STARTED):
+        self.start = start
+        self.last = start
+        self.marks = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.marks.append((name, now - self.last))
+        self.last = now
+
+    def mark_first_frame(self, root, report=False):
+        def first_frame():
+            root.update_idletasks()
+            self.mark('first frame')
+            if report:
+                self.report()
+
+        root.after_idle(first_frame)
+
+    def report(self, file=sys.stderr):
+        for name, elapsed in self.marks:
+            print(f'{name:<16}{elapsed * 1000:8.1f}ms', file=file)
+        print(f'{"asset decode":<16}{assets.decode_time * 1000:8.1f}ms (any thread, overlaps the steps above)', file=file)
+        print(f'{"total":<16}{(self.last - self.start) * 1000:8.1f}ms', file=file)
+
+
+assets = AssetRegistry()
+startup = StartupTimer()
@@ -1,9 +1,19 @@
+from Assets import assets, asset_path, startup
 import tkinter as tk
+import argparse
 import os
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
-from pygame import mixer
 from enum import Enum, auto
-from PIL import Image, ImageDraw, ImageFont, ImageOps, ImageTk
+from PIL import Image, ImageDraw
+from EngineService import EngineService
+from SpriteCache import sprite_cache
+from SoundBank import SoundBank
+from TextRenderer import text_renderer, TEXT_FONT, SYMBOL_FONT
+from ChessEngine import (
+    Position, square_index, iter_bits, move_from, move_to, move_flag, move_promotion, PROMOTION,
+    WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+    WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE
+)
 
 class Team(Enum):
     WHITE = auto()
@@ -22,22 +32,25 @@ class GameState(Enum):
     RESIGNED = auto()
 
 
-class Sounds:
-    def __getattribute__(self, name):
-        return mixer.Sound(file=super(type(Sounds), self).__getattribute__(name))
-Sounds = Sounds()
+Sounds = SoundBank({})
 
 
 class PieceImage(Enum):
-    KING = Image.open('assets/chess/king_white.png'), Image.open('assets/chess/king_black.png')
-    QUEEN = Image.open('assets/chess/queen_white.png'), Image.open('assets/chess/queen_black.png')
-    ROOK = Image.open('assets/chess/rook_white.png'), Image.open('assets/chess/rook_black.png')
-    BISHOP = Image.open('assets/chess/bishop_white.png'), Image.open('assets/chess/bishop_black.png')
-    KNIGHT = Image.open('assets/chess/knight_white.png'), Image.open('assets/chess/knight_black.png')
-    PAWN = Image.open('assets/chess/pawn_white.png'), Image.open('assets/chess/pawn_black.png')
+    KING = 'chess/king_white.png', 'chess/king_black.png'
+    QUEEN = 'chess/queen_white.png', 'chess/queen_black.png'
+    ROOK = 'chess/rook_white.png', 'chess/rook_black.png'
+    BISHOP = 'chess/bishop_white.png', 'chess/bishop_black.png'
+    KNIGHT = 'chess/knight_white.png', 'chess/knight_black.png'
+    PAWN = 'chess/pawn_white.png', 'chess/pawn_black.png'
+
+    @property
+    def images(self):
+        return tuple(assets.image(name) for name in self.value)
 
 
 class Piece:
+    KIND = None
+
     def __init__(self, parent, team, image, rank, file, chess_board):
         self.parent = parent
         self.team = team
@@ -46,164 +59,47 @@ class Piece:
         self.file = file
         self.chess_board = chess_board
         self.has_moved = False
-        self.in_future = False
-        self.stored_pos = None
+
+    @property
+    def colour(self):
+        return WHITE if self.team is Team.WHITE else BLACK
+
+    @property
+    def square_index(self):
+        return square_index(self.rank, self.file)
+
+    def legal_targets(self):
+        targets = 0
+        for move in self.chess_board.legal_moves(self.team):
+            if move_from(move) == self.square_index:
+                targets |= 1 << move_to(move)
+        return [divmod(sq, Chess.FILES) for sq in iter_bits(targets)]
 
     def check_move(self, new_rank, new_file):
-        if new_rank == self.rank and new_file == self.file:
-            return False
-        occupying_piece = self.chess_board.get_piece_at_pos(new_rank, new_file)
-        if occupying_piece is not None and occupying_piece.team is self.team:
-            return False
-        return True
+        return (new_rank, new_file) in self.legal_targets()
 
     def move(self, new_rank, new_file):
         self.rank = new_rank
         self.file = new_file
         self.has_moved = True
 
-    def premove(self, rank, file):
-        if not self.in_future:
-            self.stored_pos = self.rank, self.file
-            self.rank = rank
-            self.file = file
-            self.in_future = True
-
-    def undo_premove(self):
-        if self.in_future:
-            self.rank, self.file = self.stored_pos
-            self.stored_pos = None
-            self.in_future = False
-
-    def move_results_in_check(self, test_rank, test_file):
-        if self.team is not self.chess_board.current_player:
-            return False
-        king = self.get_team_king()
-        if king is None:
-            return
-        self.premove(test_rank, test_file)
-        would_be_check = False
-        if king.is_checked():
-            would_be_check = True
-        self.undo_premove()
-        return would_be_check
-
-    def square_is_valid_move(self, test_rank, test_file, occupying_piece):
-        if isinstance(occupying_piece, King):
-            return False
-        would_be_check = self.move_results_in_check(test_rank, test_file)
-        if occupying_piece is not None:
-            if occupying_piece.team is self.team:
-                return False
-            self.chess_board.pieces.remove(occupying_piece)
-            would_be_check = self.move_results_in_check(test_rank, test_file)
-            self.chess_board.pieces.append(occupying_piece)
-        if would_be_check:
-            return False
-        return True
-
-    def get_direction_to_check(self, d_rank, d_file):
-        if d_rank < 0 and d_file < 0:
-            return -1, -1
-        if d_rank < 0 and d_file > 0:
-            return -1, 1
-        if d_rank > 0 and d_file > 0:
-            return 1, 1
-        if d_rank > 0 and d_file < 0:
-            return 1, -1
-        if d_rank == 0 and d_file < 0:
-            return 0, -1
-        if d_rank == 0 and d_file > 0:
-            return 0, 1
-        if d_rank < 0 and d_file == 0:
-            return -1, 0
-        if d_rank > 0 and d_file == 0:
-            return 1, 0
-
     def get_team_king(self):
-        for piece in self.chess_board.pieces:
-            if isinstance(piece, King) and piece.team is self.team:
-                return piece
-        return None
+        king_sq = self.chess_board.position.king_square(self.colour)
+        if king_sq is None:
+            return None
+        return self.chess_board.get_piece_at_pos(*divmod(king_sq, Chess.FILES))
 
     def __str__(self):
         return f'{self.team.name.title()} {self.__class__.__name__} at ({self.rank}, {self.file})'
 
 
 class King(Piece):
-    def __init__(self, parent, team, image, rank, file, chess_board):
-        super(). __init__(parent, team, image, rank, file, chess_board)
-        self.has_just_castled = False
-
-    def check_move(self, new_rank, new_file, check_check=True):
-        if new_rank == self.rank and new_file == self.file:
-            return False
-        dr, df = self.get_direction_to_check(new_rank - self.rank, new_file - self.file)
-        occupying_piece = self.chess_board.get_piece_at_pos(new_rank, new_file)
-        if isinstance(occupying_piece, King):
-            return False
-        team_rooks = [
-            piece for piece in self.chess_board.pieces
-            if isinstance(piece, Rook) and piece.team is self.team
-        ]
-        can_try_castling = (
-            not self.has_moved and
-            not dr and
-            any(filter(lambda p: not p.has_moved, team_rooks)) and
-            not (check_check and self.is_checked())
-        )
-        self.has_just_castled = False
-        self.chess_board.castling_rook = None
-        for i in range(1, 3 if can_try_castling else 2):
-            test_rank = self.rank + i * dr
-            test_file = self.file + i * df
-            if check_check and self.in_check_at_square(test_rank, test_file):
-                return False
-            if new_rank == test_rank and new_file == test_file:
-                if occupying_piece is not None and occupying_piece.team is self.team:
-                    return False
-                if i == 2:
-                    for rook in team_rooks:
-                        if not rook.has_moved:
-                            if rook.file < self.file and df == -1:
-                                self.chess_board.castling_rook = rook
-                                self.has_just_castled = True
-                            elif rook.file > self.file and df == 1:
-                                self.chess_board.castling_rook = rook
-                                self.has_just_castled = True
-                            continue
-                        if rook.file > self.file and df != -1:
-                            return False
-                        if rook.file < self.file and df != 1:
-                            return False
-                return True
-            elif self.chess_board.get_piece_at_pos(test_rank, test_file) is not None:
-                return False
-        return False
+    KIND = KING
 
     def in_check_at_square(self, test_rank, test_file):
-        self.chess_board.pieces.remove(self)
-        in_check = False
-        pieces_that_could_check = [piece for piece in self.chess_board.pieces if piece.team is not self.team]
-        piece_at = self.chess_board.get_piece_at_pos(test_rank, test_file)
-        for piece in pieces_that_could_check:
-            if piece_at is not None:
-                self.chess_board.pieces.remove(piece_at)
-            if isinstance(piece, King):
-                if piece.check_move(test_rank, test_file, check_check=False):
-                    in_check = True
-            elif isinstance(piece, Pawn):
-                if piece.check_move(test_rank, test_file):
-                    if piece.file != test_file:
-                        in_check = True
-            elif piece.check_move(test_rank, test_file):
-                in_check = True
-            if piece_at is not None:
-                self.chess_board.pieces.append(piece_at)
-            if in_check:
-                break
-        self.chess_board.pieces.append(self)
-        return in_check
+        position = self.chess_board.position
+        occupancy = position.all_occupancy() & ~(1 << self.square_index)
+        return position.is_attacked(square_index(test_rank, test_file), self.colour ^ 1, occupancy)
 
     def is_checked(self):
         checked = self.in_check_at_square(self.rank, self.file)
@@ -211,136 +107,28 @@ class King(Piece):
 
 
 class Queen(Piece):
-    def check_move(self, new_rank, new_file):
-        if self.in_future:
-            test_against_rank, test_against_file = self.stored_pos
-        else:
-            test_against_rank, test_against_file = self.rank, self.file
-        if new_rank == test_against_rank and new_file == test_against_file:
-            return False
-        dr, df = self.get_direction_to_check(new_rank - test_against_rank, new_file - test_against_file)
-        occupying_piece = self.chess_board.get_piece_at_pos(new_rank, new_file)
-        for i in range(1, 8):
-            test_rank = test_against_rank + i * dr
-            test_file = test_against_file + i * df
-            if new_rank == test_rank and new_file == test_file:
-                return self.square_is_valid_move(test_rank, test_file, occupying_piece)
-            elif self.chess_board.get_piece_at_pos(test_rank, test_file) is not None:
-                return False
-        return False
+    KIND = QUEEN
 
 
 class Bishop(Piece):
-    def check_move(self, new_rank, new_file):
-        if self.in_future:
-            test_against_rank, test_against_file = self.stored_pos
-        else:
-            test_against_rank, test_against_file = self.rank, self.file
-        if new_rank == test_against_rank and new_file == test_against_file:
-            return False
-        dr, df = self.get_direction_to_check(new_rank - test_against_rank, new_file - test_against_file)
-        occupying_piece = self.chess_board.get_piece_at_pos(new_rank, new_file)
-        if abs(dr) != abs(df):
-            return False
-        for i in range(1, 8):
-            test_rank = test_against_rank + i * dr
-            test_file = test_against_file + i * df
-            if new_rank == test_rank and new_file == test_file:
-                return self.square_is_valid_move(test_rank, test_file, occupying_piece)
-            elif self.chess_board.get_piece_at_pos(test_rank, test_file) is not None:
-                return False
-        return False
+    KIND = BISHOP
 
 
 class Rook(Piece):
-    def check_move(self, new_rank, new_file):
-        if self.in_future:
-            test_against_rank, test_against_file = self.stored_pos
-        else:
-            test_against_rank, test_against_file = self.rank, self.file
-        if new_rank == test_against_rank and new_file == test_against_file:
-            return False
-        dr, df = self.get_direction_to_check(new_rank - test_against_rank, new_file - test_against_file)
-        occupying_piece = self.chess_board.get_piece_at_pos(new_rank, new_file)
-        if dr != 0 and df != 0:
-            return False
-        for i in range(1, 8):
-            test_rank = test_against_rank + i * dr
-            test_file = test_against_file + i * df
-            if new_rank == test_rank and new_file == test_file:
-                return self.square_is_valid_move(test_rank, test_file, occupying_piece)
-            elif self.chess_board.get_piece_at_pos(test_rank, test_file) is not None:
-                return False
-        return False
+    KIND = ROOK
 
 
 class Knight(Piece):
-    def check_move(self, new_rank, new_file):
-        if self.in_future:
-            test_against_rank, test_against_file = self.stored_pos
-        else:
-            test_against_rank, test_against_file = self.rank, self.file
-        if new_rank == test_against_rank and new_file == test_against_file:
-            return False
-        occupying_piece = self.chess_board.get_piece_at_pos(new_rank, new_file)
-        for dr in range(-2, 3):
-            for df in range(-2, 3):
-                if abs(dr) == abs(df):
-                    continue
-                if dr == 0 or df == 0:
-                    continue
-                test_rank = test_against_rank + dr
-                test_file = test_against_file + df
-                if new_rank == test_rank and new_file == test_file:
-                   return self.square_is_valid_move(test_rank, test_file, occupying_piece)
-        return False
+    KIND = KNIGHT
 
 
 class Pawn(Piece):
+    KIND = PAWN
+
     def __init__(self, parent, team, image, rank, file, chess_board):
         super(). __init__(parent, team, image, rank, file, chess_board)
         self.has_just_moved_double = False
 
-    def check_move(self, new_rank, new_file):
-        if self.in_future:
-            test_against_rank, test_against_file = self.stored_pos
-        else:
-            test_against_rank, test_against_file = self.rank, self.file
-        if new_rank == test_against_rank and new_file == test_against_file:
-            return False
-        self.chess_board.pawn_captured_en_passant = None
-        dr, df = self.get_direction_to_check(new_rank - test_against_rank, new_file - test_against_file)
-        if (dr > 0 and self.team is Team.WHITE) or (dr < 0 and self.team is Team.BLACK):
-            return False
-        occupying_piece = self.chess_board.get_piece_at_pos(new_rank, new_file)
-        if df == 0:
-            for i in range(1, 3 if not self.has_moved else 2):
-                test_rank = test_against_rank + i * dr
-                test_file = test_against_file + i * df
-                if new_rank == test_rank and new_file == test_file:
-                    if occupying_piece is not None:
-                        return False
-                    self.has_just_moved_double = i == 2
-                    if self.move_results_in_check(test_rank, test_file):
-                        return False
-                    return True
-                elif self.chess_board.get_piece_at_pos(test_rank, test_file) is not None:
-                    return False
-        elif abs(dr) == 1:
-            test_rank = test_against_rank + dr
-            test_file = test_against_file + df
-            if test_rank == new_rank and test_file == new_file:
-                if self.move_results_in_check(test_rank, test_file):
-                    return False
-                elif occupying_piece is not None and occupying_piece.team is not self.team:
-                    return True
-                elif occupying_piece is None:
-                    en_passant_pawn = self.chess_board.get_piece_at_pos(test_against_rank, test_file)
-                    if isinstance(en_passant_pawn, Pawn) and en_passant_pawn.has_just_moved_double and en_passant_pawn.team is not self.team:
-                        self.chess_board.pawn_captured_en_passant = en_passant_pawn
-                        return True
-        return False
-
 
 class Square(tk.Label):
     SQUARE_SIZE = 64
@@ -352,11 +140,13 @@ class Square(tk.Label):
         self.occupying_piece = None
         self.background_image = background_image
         self.highlight_colour = None
-        self.tk_image = ImageTk.PhotoImage(self.background_image)
-        super().__init__(parent, width=Square.SQUARE_SIZE, height=Square.SQUARE_SIZE, bd=0, image=self.tk_image)
+        super().__init__(parent, width=Square.SQUARE_SIZE, height=Square.SQUARE_SIZE, bd=0, image=sprite_cache.get(self.background_image))
 
     def add_text(self, rank, file, chess_board):
-        fnt = ImageFont.truetype('assets/fonts/Rubik-Medium.ttf', 13)
+        # Unlabelled squares keep the shared background, so their composites are shared too.
+        if file != 0 and rank != Chess.RANKS-1:
+            return
+        fnt = text_renderer.get_font(TEXT_FONT, 13)
         new_bg = self.background_image.copy()
         d = ImageDraw.Draw(new_bg)
 
@@ -372,42 +162,28 @@ class Square(tk.Label):
             d.text((Square.SQUARE_SIZE-9, Square.SQUARE_SIZE-16), chr(97+file), font=fnt, fill=font_colour)
 
         self.background_image = new_bg
-        self.tk_image = ImageTk.PhotoImage(self.background_image)
-        self.config(image=self.tk_image)
+        self.redraw()
+
+    def redraw(self):
+        piece_image = None if self.occupying_piece is None else self.occupying_piece.image
+        self.config(image=sprite_cache.get(self.background_image, self.highlight_colour, piece_image, (2, 2)))
 
     def highlight(self, colour_rgb):
         self.highlight_colour = colour_rgb
-        highlighted = ImageOps.colorize(
-            ImageOps.grayscale(self.background_image),
-            black=tuple(int(.3 * c) for c in colour_rgb),
-            white=tuple(min(c+100, 255) for c in colour_rgb)
-        )
-        self.tk_image = ImageTk.PhotoImage(highlighted)
-        if self.occupying_piece is None:
-            self.config(image=self.tk_image)
-        else:
-            self.place_piece(self.occupying_piece)
+        self.redraw()
 
     def remove_highlight(self):
         self.highlight_colour = None
-        self.tk_image = ImageTk.PhotoImage(self.background_image)
-        if self.occupying_piece is None:
-            self.config(image=self.tk_image)
-        else:
-            self.place_piece(self.occupying_piece)
+        self.redraw()
 
     def place_piece(self, piece):
         self.occupying_piece = piece
-        piece_image = piece.image
-        composite = ImageTk.getimage(self.tk_image).copy()
-        composite.paste(piece_image, (2, 2), piece_image)
-        self.tk_image = ImageTk.PhotoImage(composite)
-        self.config(image=self.tk_image)
+        self.redraw()
 
     def remove_piece(self):
         self.occupying_piece = None
-        self.tk_image = ImageTk.PhotoImage(self.background_image)
-        self.config(image=self.tk_image)
+        self.highlight_colour = None
+        self.redraw()
 
 
 class Chess:
@@ -423,6 +199,7 @@ class Chess:
         Pawn: 'P'
     }
     UI_FONT_SIZE = 20
+    COMPUTER_POLL_MS = 50
 
     def __init__(self,
                  parent,
@@ -431,7 +208,10 @@ class Chess:
                  sound_channel,
                  allow_play_again,
                  show_game_over_screen,
-                 load_position=None
+                 load_position=None,
+                 computer_players=(),
+                 computer_time_limit=1.0,
+                 computer_hash_mb=16
         ):
         self.parent = parent
         self.square_sheet = square_sheet
@@ -439,6 +219,12 @@ class Chess:
         self.sound_channel = sound_channel
         self.allow_play_again = allow_play_again,
         self.show_game_over_screen = show_game_over_screen
+        self.computer_players = computer_players
+        self.engine = EngineService(time_limit=computer_time_limit, hash_size_mb=computer_hash_mb)
+        self.computer_search_id = None
+        self.computer_search_fen = None
+        self.computer_analysis = None
+        self.computer_polling = False
         self.move_listener_flag = None
         self.parent_root = self.parent.winfo_toplevel()
         self.squares = []
@@ -447,16 +233,14 @@ class Chess:
         self.resigned_player = None
         self.board_flipped = False
         self.selected_piece = None
-        self.pawn_captured_en_passant = None
-        self.castling_rook = None
         self.piece_just_moved = None
+        self.position = Position()
         self.game_state = GameState.PLAYING
         self.halfmove_clock = 0
         self.fullmove_number = 1
-        self.last_moves = []
+        self.repetitions = {}
         self.highlight_move_colour = (0, 255, 0)
         self.highlight_check_colour = (255, 0, 0)
-        self.texts = {}
         spritesheet = Image.open(square_sheet)
         self.LIGHT_SQUARE_IMAGE = spritesheet.crop((0, 0, 64, 64))
         self.DARK_SQUARE_IMAGE = spritesheet.crop((64, 0, 128, 64))
@@ -468,7 +252,9 @@ class Chess:
             self.create_classic_setup()
         else:
             self.load_fen_notation(load_position)
-        self.last_moves.append(self.generate_fen_notation())
+        self.update_position_state()
+        self.record_position()
+        self.parent.after(1, self.request_computer_move)
 
     def _config_widgets(self):
         self.parent.grid_propagate(False)
@@ -480,21 +266,12 @@ class Chess:
         )
 
     def _make_text_label(self, parent, text, font_size, flip_colours=False, symbol=False):
-        if text not in self.texts:
-            if not symbol:
-                fnt = ImageFont.truetype('assets/fonts/Rubik-Medium.ttf', font_size)
-            else:
-                fnt = ImageFont.truetype('assets/fonts/Symbola.ttf', font_size)
-            size = fnt.getbbox(text)
-            bg, fg = (self.light_colour, self.dark_colour) if not flip_colours else (self.dark_colour, self.light_colour)
-            text_img = Image.new('RGBA', (size[2], size[3]), bg)
-            d = ImageDraw.Draw(text_img, 'RGBA')
-            d.text((0, 0), text, font=fnt, fill=fg)
-            text_tk = ImageTk.PhotoImage(text_img)
-            self.texts[text] = text_tk
-        else:
-            text_tk = self.texts[text]
+        bg, fg = (self.light_colour, self.dark_colour) if not flip_colours else (self.dark_colour, self.light_colour)
+        text_tk = text_renderer.get(
+            text, SYMBOL_FONT if symbol else TEXT_FONT, font_size, fill=fg, background=bg, crop=False
+        )
         text_label = tk.Label(parent, bd=0, image=text_tk)
+        text_label.image = text_tk
         return text_label
 
     def set_up_board(self):
@@ -518,27 +295,26 @@ class Chess:
                 square.remove_highlight()
 
     def create_piece(self, rank, file, piece_cls, team):
-        images = PieceImage[piece_cls.__name__.upper()].value
+        images = PieceImage[piece_cls.__name__.upper()].images
         image = images[0] if team is Team.WHITE else images[1]
         piece = piece_cls(self.parent, team, image, rank, file, self)
         square = self.squares[rank][file]
         square.place_piece(piece)
         self.pieces.append(piece)
+        self.position.add_piece(square_index(rank, file), piece.colour, piece.KIND)
         return piece
 
     def get_piece_at_pos(self, rank, file):
-        for piece in self.pieces:
-            if piece.rank == rank and piece.file == file:
-                return piece
-        return None
+        if rank not in range(Chess.RANKS) or file not in range(Chess.FILES):
+            return None
+        return self.squares[rank][file].occupying_piece
 
     def get_current_king(self):
-        try:
-            king = [piece for piece in self.pieces if isinstance(piece, King) and piece.team is self.current_player][0]
-        except IndexError:
+        colour = WHITE if self.current_player is Team.WHITE else BLACK
+        king_sq = self.position.king_square(colour)
+        if king_sq is None:
             return None
-        else:
-            return king
+        return self.get_piece_at_pos(*divmod(king_sq, Chess.FILES))
 
     def create_classic_setup(self):
         for file in range(Chess.FILES):
@@ -578,11 +354,12 @@ class Chess:
         self.halfmove_clock = 0
         self.fullmove_number = 1
         self.selected_piece = None
-        self.pawn_captured_en_passant = None
-        self.castling_rook = None
         self.piece_just_moved = None
+        self.update_position_state()
+        self.record_position()
         if self.board_flipped:
             self.flip_board()
+        self.request_computer_move()
 
     def flip_board(self):
         if not self.flip_after_move:
@@ -610,6 +387,8 @@ class Chess:
     def left_click_handler(self, event):
         if self.game_state is not GameState.PLAYING:
             return
+        if self.current_player in self.computer_players:
+            return
         rank, file = self._coords_to_square(event)
         square_clicked = self.squares[rank][file]
         if self.selected_piece is None:
@@ -706,8 +485,98 @@ class Chess:
             self.current_player = override
         else:
             self.current_player = Team.WHITE if self.current_player is Team.BLACK else Team.BLACK
+        self.update_position_state()
+
+    def update_position_state(self):
+        side = WHITE if self.current_player is Team.WHITE else BLACK
+        castling = 0
+        castling_rights = (
+            (Team.WHITE, WHITE_KINGSIDE, WHITE_QUEENSIDE),
+            (Team.BLACK, BLACK_KINGSIDE, BLACK_QUEENSIDE)
+        )
+        for team, kingside, queenside in castling_rights:
+            back_rank = Chess.RANKS - 1 if team is Team.WHITE else 0
+            king = self.get_piece_at_pos(back_rank, 4)
+            if not isinstance(king, King) or king.team is not team or king.has_moved:
+                continue
+            for rook_file, right in ((Chess.FILES - 1, kingside), (0, queenside)):
+                rook = self.get_piece_at_pos(back_rank, rook_file)
+                if isinstance(rook, Rook) and rook.team is team and not rook.has_moved:
+                    castling |= right
+        ep_square = None
+        pawn = self.piece_just_moved
+        if isinstance(pawn, Pawn) and pawn.has_just_moved_double and pawn in self.pieces:
+            dr = 1 if pawn.team is Team.WHITE else -1
+            ep_square = square_index(pawn.rank + dr, pawn.file)
+        self.position.set_state(side, castling, ep_square)
+
+    def record_position(self):
+        if self.halfmove_clock == 0:
+            self.repetitions.clear()
+        key = self.position.key
+        self.repetitions[key] = self.repetitions.get(key, 0) + 1
+
+    def legal_moves(self, team):
+        return self.position.legal_moves(WHITE if team is Team.WHITE else BLACK)
+
+    def request_computer_move(self):
+        if self.game_state is not GameState.PLAYING or self.current_player not in self.computer_players:
+            self.cancel_computer_move()
+            return
+        fen = self.generate_fen_notation()
+        if self.computer_search_id is not None and fen == self.computer_search_fen:
+            return
+        self.computer_search_fen = fen
+        self.computer_analysis = None
+        self.computer_search_id = self.engine.search(fen, game_keys=self.repetitions)
+        if not self.computer_polling:
+            self.computer_polling = True
+            self.parent.after(Chess.COMPUTER_POLL_MS, self._poll_computer_move)
+
+    def cancel_computer_move(self):
+        if self.computer_search_id is not None:
+            self.engine.cancel()
+        self.computer_search_id = None
+        self.computer_search_fen = None
+
+    def _poll_computer_move(self):
+        if self.computer_search_id is None:
+            self.computer_polling = False
+            return
+        if not self.engine.is_alive:
+            self.computer_search_id = None
+            self.computer_polling = False
+            self.request_computer_move()
+            return
+        best_move = None
+        for message in self.engine.poll():
+            if message[1] != self.computer_search_id:
+                continue
+            if message[0] == 'info':
+                self.computer_analysis = message[2:]
+            else:
+                best_move = message
+        if best_move is None:
+            self.parent.after(Chess.COMPUTER_POLL_MS, self._poll_computer_move)
+            return
+        self.computer_polling = False
+        self.computer_search_id = None
+        move = best_move[2]
+        if (
+            move is None or
+            self.game_state is not GameState.PLAYING or
+            self.generate_fen_notation() != self.computer_search_fen or
+            move not in self.position.legal_moves()
+        ):
+            self.request_computer_move()
+            return
+        self.selected_piece = self.get_piece_at_pos(*divmod(move_from(move), Chess.FILES))
+        promotion = None
+        if move_flag(move) == PROMOTION:
+            promotion = {piece_cls.KIND: piece_cls for piece_cls in Chess.PIECE_TO_ASCII}[move_promotion(move)]
+        self.player_move(*divmod(move_to(move), Chess.FILES), promotion=promotion)
 
-    def player_move(self, new_rank, new_file):
+    def player_move(self, new_rank, new_file, promotion=None):
         piece_to_move = self.selected_piece
         can_move = piece_to_move.check_move(new_rank, new_file)
         if can_move:
@@ -716,41 +585,42 @@ class Chess:
             for pawn in [piece for piece in self.pieces if isinstance(piece, Pawn)]:
                 if pawn is not piece_to_move:
                     pawn.has_just_moved_double = False
-            if isinstance(piece_to_move, King) and piece_to_move.has_just_castled:
-                df = 1 if self.castling_rook.file < piece_to_move.file else -1
-                self.move_piece(self.castling_rook, new_rank, new_file + df)
-                self.castling_rook = None
+            if isinstance(piece_to_move, King) and abs(new_file - piece_to_move.file) == 2:
+                castling_rook = self.get_piece_at_pos(new_rank, 0 if new_file < piece_to_move.file else Chess.FILES - 1)
+                df = 1 if castling_rook.file < piece_to_move.file else -1
+                self.move_piece(castling_rook, new_rank, new_file + df)
             self.selected_piece = None
             captured_piece = self.get_piece_at_pos(new_rank, new_file)
+            if isinstance(piece_to_move, Pawn):
+                if captured_piece is None and new_file != piece_to_move.file:
+                    captured_piece = self.get_piece_at_pos(piece_to_move.rank, new_file)
+                piece_to_move.has_just_moved_double = abs(new_rank - piece_to_move.rank) == 2
             if captured_piece is not None:
                 self.capture_piece(captured_piece)
                 self.halfmove_clock = 0
             self.move_piece(piece_to_move, new_rank, new_file)
             if isinstance(piece_to_move, Pawn):
                 self.halfmove_clock = 0
-                if self.pawn_captured_en_passant is not None:
-                    self.capture_piece(self.pawn_captured_en_passant)
-                    self.pawn_captured_en_passant = None
                 if new_rank == 0 or new_rank == Chess.RANKS - 1:
-                    self.promote_piece(piece_to_move)
+                    self.promote_piece(piece_to_move, promotion)
             if self.current_player is Team.BLACK:
                 self.fullmove_number += 1
             self.change_player()
             self.highlight_check()
-            self.last_moves.append(self.generate_fen_notation())
-            while len(self.last_moves) > 9:
-                self.last_moves.pop(0)
+            self.record_position()
             over = self.is_game_over()
             if not over:
                 self.flip_board()
             if self.move_listener_flag is not None:
                 self.move_listener_flag.set(self.current_player.name)
+            self.request_computer_move()
 
     def move_piece(self, piece, new_rank, new_file):
         current_square = self.squares[piece.rank][piece.file]
         current_square.remove_piece()
         new_square = self.squares[new_rank][new_file]
         new_square.place_piece(piece)
+        self.position.move_piece(piece.square_index, square_index(new_rank, new_file))
         piece.move(new_rank, new_file)
         self.piece_just_moved = piece
 
@@ -758,8 +628,13 @@ class Chess:
         current_square = self.squares[piece.rank][piece.file]
         current_square.remove_piece()
         self.pieces.remove(piece)
+        self.position.remove_piece(piece.square_index)
 
-    def promote_piece(self, piece):
+    def promote_piece(self, piece, promotion=None):
+        if promotion is not None:
+            self.capture_piece(piece)
+            self.create_piece(piece.rank, piece.file, promotion, piece.team)
+            return
         self.pause_toggle()
         promote_root = tk.Toplevel()
         promote_root.resizable(0, 0)
@@ -801,6 +676,7 @@ class Chess:
             promotion = piece_index[squares.index(square)]
             self.capture_piece(piece)
             self.create_piece(piece.rank, piece.file, promotion, piece.team)
+            self.record_position()
             promote_root.grab_release()
             promote_root.destroy()
             for rank in self.squares:
@@ -811,7 +687,7 @@ class Chess:
             colour = self.DARK_SQUARE_IMAGE if i % 2 else self.LIGHT_SQUARE_IMAGE
             square = Square(promotion_frame, colour, None, None)
             piece_cls = piece_index[i]
-            images = PieceImage[piece_cls.__name__.upper()].value
+            images = PieceImage[piece_cls.__name__.upper()].images
             image = images[0] if piece.team is Team.WHITE else images[1]
             square_piece = piece_cls(promotion_frame, piece.team, image, 0, 0, None)
             square.place_piece(square_piece)
@@ -832,11 +708,9 @@ class Chess:
             return
         if self.selected_piece.team is not self.current_player:
             return
-        for r in range(Chess.RANKS):
-            for f in range(Chess.FILES):
-                if self.selected_piece.check_move(r, f) or (self.selected_piece.rank == r and self.selected_piece.file == f):
-                    square = self.squares[r][f]
-                    square.highlight(self.highlight_move_colour)
+        self.squares[self.selected_piece.rank][self.selected_piece.file].highlight(self.highlight_move_colour)
+        for r, f in self.selected_piece.legal_targets():
+            self.squares[r][f].highlight(self.highlight_move_colour)
 
     def grey_out_board(self):
         for rank in self.squares:
@@ -854,33 +728,23 @@ class Chess:
         if self.game_state is GameState.PAUSED:
             self.reset_board_colouring()
             self.game_state = GameState.PLAYING
+            self.request_computer_move()
         else:
             self.grey_out_board()
             self.game_state = GameState.PAUSED
+            self.cancel_computer_move()
 
     def is_game_over(self):
         if (king := self.get_current_king()) is None:
             return
-        king_pieces = [piece for piece in self.pieces if piece.team is king.team]
-        any_piece_can_move = False
-        for piece in king_pieces:
-            for rank in range(Chess.RANKS):
-                for file in range(Chess.FILES):
-                    if piece.check_move(rank, file):
-                        any_piece_can_move = True
-                        break
-        if not any_piece_can_move:
+        if not self.legal_moves(king.team):
             if king.is_checked():
                 self.game_state = GameState.CHECKMATE
             else:
                 self.game_state = GameState.STALEMATE
         if self.halfmove_clock == 100:
             self.game_state = GameState.FIFTY_MOVE
-        if len(self.last_moves) == 9 and (
-                self.last_moves[0].split()[:4] ==
-                self.last_moves[4].split()[:4] ==
-                self.last_moves[8].split()[:4]
-            ):
+        if self.repetitions.get(self.position.key, 0) >= 3:
             self.game_state = GameState.THREEFOLD_REPETITION
 
         insufficient_material_cases = [
@@ -1037,75 +901,75 @@ class Chess:
         return ' '.join(fen_notation)
 
     def load_fen_notation(self, fen_notation):
-        board, turn, castling, en_passant, halfmove, fullmove = fen_notation.split()
-        turn = turn.lower()
-        if turn not in 'wb':
-            raise ValueError(f'Invalid player value. Must be one of (w, b), not {turn}')
-        ascii_to_piece = {value: key for key, value in Chess.PIECE_TO_ASCII.items()}
-        for rank_index, rank in enumerate(board.split('/')):
-            current_file_index = 0
-            for char in rank:
-                if char.isnumeric():
-                    if int(char) not in range(1, 9):
-                        raise ValueError(f'Invalid number of empty squares: {char}')
-                    current_file_index += int(char)
-                else:
-                    if char.lower() not in 'kqbrnp':
-                        raise ValueError(f'Invalid piece notation: {char}')
-                    piece_cls = ascii_to_piece[char.upper()]
-                    team = Team.WHITE if char.isupper() else Team.BLACK
-                    piece = self.create_piece(rank_index, current_file_index, piece_cls, team)
-                    if piece_cls is Pawn:
-                        if team is Team.WHITE and rank_index != Chess.RANKS - 2:
-                            piece.has_moved = True
-                        elif team is Team.BLACK and rank_index != 1:
-                            piece.has_moved = True
-                    if piece_cls is Rook:
-                        piece.has_moved = True
-                    current_file_index += 1
-        if turn == 'w':
-            self.current_player = Team.WHITE
-        elif turn == 'b':
-            self.current_player = Team.BLACK
-
-        if castling != '-':
-            if 'K' in castling:
-                self.squares[Chess.RANKS-1][Chess.FILES-1].occupying_piece.has_moved = False
-            if 'Q' in castling:
-                self.squares[Chess.RANKS-1][0].occupying_piece.has_moved = False
-            if 'k' in castling:
-                self.squares[0][Chess.FILES-1].occupying_piece.has_moved = False
-            if 'q' in castling:
-                self.squares[0][0].occupying_piece.has_moved = False
-
-        if en_passant != '-':
-            ep_file = ord(en_passant[0])-97
-            ep_rank = Chess.RANKS - int(en_passant[1])
-            if turn == 'w':
-                dr = 1
-            elif turn == 'b':
-                dr = -1
-            self.squares[ep_rank + dr][ep_file].occupying_piece.has_just_moved_double = True
-
-        self.halfmove_clock = int(halfmove)
-        self.fullmove_number = int(fullmove)
+        position = Position()
+        position.load_fen_notation(fen_notation)
+        kind_to_piece = {piece_cls.KIND: piece_cls for piece_cls in Chess.PIECE_TO_ASCII}
+        for sq, code in enumerate(position.mailbox):
+            if code is None:
+                continue
+            colour, kind = divmod(code, 6)
+            rank, file = divmod(sq, Chess.FILES)
+            team = Team.WHITE if colour == WHITE else Team.BLACK
+            piece = self.create_piece(rank, file, kind_to_piece[kind], team)
+            if kind == PAWN:
+                if team is Team.WHITE and rank != Chess.RANKS - 2:
+                    piece.has_moved = True
+                elif team is Team.BLACK and rank != 1:
+                    piece.has_moved = True
+            if kind == ROOK:
+                piece.has_moved = True
+        self.current_player = Team.WHITE if position.side == WHITE else Team.BLACK
+
+        castling_rooks = (
+            (WHITE_KINGSIDE, Chess.RANKS - 1, Chess.FILES - 1),
+            (WHITE_QUEENSIDE, Chess.RANKS - 1, 0),
+            (BLACK_KINGSIDE, 0, Chess.FILES - 1),
+            (BLACK_QUEENSIDE, 0, 0)
+        )
+        for right, rank, file in castling_rooks:
+            rook = self.get_piece_at_pos(rank, file)
+            if position.castling & right and isinstance(rook, Rook):
+                rook.has_moved = False
+
+        if position.ep_square is not None:
+            ep_rank, ep_file = divmod(position.ep_square, Chess.FILES)
+            dr = 1 if position.side == WHITE else -1
+            self.piece_just_moved = self.get_piece_at_pos(ep_rank + dr, ep_file)
+            if isinstance(self.piece_just_moved, Pawn):
+                self.piece_just_moved.has_just_moved_double = True
 
+        self.halfmove_clock = position.halfmove_clock
+        self.fullmove_number = position.fullmove_number
 
 if __name__ == '__main__':
+    startup.mark('imports')
+    parser = argparse.ArgumentParser(description='Play chess.')
+    parser.add_argument('-t', '--timings', action='store_true', help='print a startup timing breakdown once the first frame is drawn')
+    parser.add_argument('-c', '--computer', action='append', choices=['white', 'black'], default=[], help='let the computer play this side, repeat for both (default: none)')
+    parser.add_argument('--computer-time', type=float, default=1.0, help='seconds the computer may think per move (default: 1.0)')
+    args = parser.parse_args()
+    assets.prefetch(name for piece in PieceImage for name in piece.value)
+    from pygame import mixer
     mixer.pre_init(buffer=4096)
     mixer.init()
+    Sounds.load_in_background()
     chess_sound = mixer.Channel(0)
+    startup.mark('mixer')
     root = tk.Tk()
     root.resizable(0, 0)
     root.title('Chess')
     chess_frame = tk.Frame(root)
     chess = Chess(
         parent=chess_frame,
-        square_sheet='assets/chess/squares.png',
+        square_sheet=asset_path('chess/squares.png'),
         sound_channel=chess_sound,
         flip_after_move=False,
         allow_play_again=True,
-        show_game_over_screen=True
+        show_game_over_screen=True,
+        computer_players=tuple(Team[name.upper()] for name in args.computer),
+        computer_time_limit=args.computer_time
     )
     chess_frame.grid(row=0, column=0)
+    startup.mark('widgets')
+    startup.mark_first_frame(root, args.timings)
     root.mainloop()
\ No newline at end of file
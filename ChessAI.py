@@ -0,0 +1,439 @@
+import argparse
+import time
+from array import array
+from ChessEngine import (
+    Position, iter_bits, move_flag, move_promotion,
+    WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+    EN_PASSANT, PROMOTION, FILES
+)
+
+
+PIECE_VALUES = (100, 320, 330, 500, 900, 0)
+MATE_SCORE = 100000
+MAX_PLY = 64
+INFINITY = 1000000
+
+# Piece-square tables from white's point of view, eighth rank first to match square indices.
+PIECE_SQUARE_TABLES = (
+    (
+         0,   0,   0,   0,   0,   0,   0,   0,
+        50,  50,  50,  50,  50,  50,  50,  50,
+        10,  10,  20,  30,  30,  20,  10,  10,
+         5,   5,  10,  25,  25,  10,   5,   5,
+         0,   0,   0,  20,  20,   0,   0,   0,
+         5,  -5, -10,   0,   0, -10,  -5,   5,
+         5,  10,  10, -20, -20,  10,  10,   5,
+         0,   0,   0,   0,   0,   0,   0,   0
+    ),
+    (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20,   0,   0,   0,   0, -20, -40,
+        -30,   0,  10,  15,  15,  10,   0, -30,
+        -30,   5,  15,  20,  20,  15,   5, -30,
+        -30,   0,  15,  20,  20,  15,   0, -30,
+        -30,   5,  10,  15,  15,  10,   5, -30,
+        -40, -20,   0,   5,   5,   0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50
+    ),
+    (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,  10,  10,   5,   0, -10,
+        -10,   5,   5,  10,  10,   5,   5, -10,
+        -10,   0,  10,  10,  10,  10,   0, -10,
+        -10,  10,  10,  10,  10,  10,  10, -10,
+        -10,   5,   0,   0,   0,   0,   5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20
+    ),
+    (
+         0,   0,   0,   0,   0,   0,   0,   0,
+         5,  10,  10,  10,  10,  10,  10,   5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+         0,   0,   0,   5,   5,   0,   0,   0
+    ),
+    (
+        -20, -10, -10,  -5,  -5, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,   5,   5,   5,   0, -10,
+         -5,   0,   5,   5,   5,   5,   0,  -5,
+          0,   0,   5,   5,   5,   5,   0,  -5,
+        -10,   5,   5,   5,   5,   5,   0, -10,
+        -10,   0,   5,   0,   0,   0,   0, -10,
+        -20, -10, -10,  -5,  -5, -10, -10, -20
+    ),
+    (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+         20,  20,   0,   0,   0,   0,  20,  20,
+         20,  30,  10,   0,   0,  10,  30,  20
+    )
+)
+# Black reads the same tables with the ranks mirrored.
+PIECE_SQUARE_VALUES = tuple(
+    tuple(
+        PIECE_VALUES[kind] + PIECE_SQUARE_TABLES[kind][sq if colour == WHITE else sq ^ 56]
+        for sq in range(64)
+    )
+    for colour in (WHITE, BLACK)
+    for kind in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)
+)
+
+BENCHMARK_POSITIONS = (
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    ENTRY_BYTES = 16
+    BUCKET_SIZE = 2
+    EXACT, LOWER, UPPER = 1, 2, 3
+    SCORE_OFFSET = 1 << 21
+
+    def __init__(self, size_mb=16, buffer=None):
+        table_bytes = TranspositionTable.table_bytes(size_mb)
+        self.mask = table_bytes // (TranspositionTable.ENTRY_BYTES * TranspositionTable.BUCKET_SIZE) - 1
+        # Each entry is two unsigned 64-bit words: the Zobrist key xor the data, then the packed data.
+        # The xor lets processes sharing one buffer reject entries torn by a concurrent write.
+        if buffer is None:
+            self.slots = array('Q', bytes(table_bytes))
+        else:
+            self.slots = memoryview(buffer)[:table_bytes].cast('Q')
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    @staticmethod
+    def table_bytes(size_mb):
+        bucket_bytes = TranspositionTable.ENTRY_BYTES * TranspositionTable.BUCKET_SIZE
+        bucket_count = max(1, int(size_mb * 2**20) // bucket_bytes)
+        return (1 << (bucket_count.bit_length() - 1)) * bucket_bytes
+
+    @property
+    def size_bytes(self):
+        return len(self.slots) * self.slots.itemsize
+
+    def clear(self):
+        memoryview(self.slots).cast('B')[:] = bytes(self.size_bytes)
+        self.age = 0
+
+    def new_search(self):
+        self.age = (self.age + 1) & 0xFF
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def probe(self, key):
+        slots = self.slots
+        index = (key & self.mask) << 2
+        for i in (index, index + 2):
+            data = slots[i + 1]
+            if data and slots[i] ^ data == key:
+                self.hits += 1
+                return (
+                    data & 0x3FFFF,
+                    data >> 18 & 0xFF,
+                    data >> 26 & 0x3,
+                    (data >> 36) - TranspositionTable.SCORE_OFFSET
+                )
+        self.misses += 1
+        if slots[index + 1] or slots[index + 3]:
+            self.collisions += 1
+        return None
+
+    def store(self, key, move, depth, bound, score):
+        slots = self.slots
+        index = (key & self.mask) << 2
+        # Slot 0 keeps the deepest result from the current search, slot 1 always takes the newest.
+        existing = slots[index + 1]
+        if (
+            not existing or
+            slots[index] ^ existing == key or
+            existing >> 28 & 0xFF != self.age or
+            depth >= existing >> 18 & 0xFF
+        ):
+            i = index
+        else:
+            i = index + 2
+        data = (
+            move | depth << 18 | bound << 26 | self.age << 28 |
+            (score + TranspositionTable.SCORE_OFFSET) << 36
+        )
+        slots[i] = key ^ data
+        slots[i + 1] = data
+        self.stores += 1
+
+    def hashfull(self):
+        sample = min(1000, len(self.slots) // 2)
+        used = 0
+        for i in range(sample):
+            data = self.slots[2 * i + 1]
+            if data and data >> 28 & 0xFF == self.age:
+                used += 1
+        return used * 1000 // sample
+
+
+def score_to_table(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score + ply
+    return score
+
+
+def evaluate(position):
+    score = 0
+    bitboards = position.bitboards
+    for code in range(6):
+        values = PIECE_SQUARE_VALUES[code]
+        for sq in iter_bits(bitboards[code]):
+            score += values[sq]
+    for code in range(6, 12):
+        values = PIECE_SQUARE_VALUES[code]
+        for sq in iter_bits(bitboards[code]):
+            score -= values[sq]
+    return score if position.side == WHITE else -score
+
+
+def is_tactical(position, move):
+    return position.mailbox[move >> 6 & 63] is not None or move_flag(move) in (EN_PASSANT, PROMOTION)
+
+
+class ChessAI:
+    NODES_BETWEEN_CLOCK_CHECKS = 1024
+
+    def __init__(self, time_limit=1.0, max_depth=MAX_PLY - 1, hash_size_mb=16, table=None):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        # A table passed in, such as one over shared memory, is used as is and hash_size_mb is ignored.
+        self.table = TranspositionTable(hash_size_mb) if table is None else table
+        self.stopped = False
+        self.deadline = 0
+        self.should_stop = None
+        self.nodes = 0
+        self.elapsed = 0
+        self.seen_keys = set()
+        self.game_keys = set()
+        self.killers = []
+        self.history = []
+        self.pv_table = []
+        self.pv_length = []
+        self.previous_pv = []
+
+    @property
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed else 0
+
+    def stop(self):
+        self.stopped = True
+
+    def search(self, position, time_limit=None, game_keys=(), on_iteration=None, should_stop=None, start_depth=1):
+        start = time.perf_counter()
+        self.deadline = start + (self.time_limit if time_limit is None else time_limit)
+        self.should_stop = should_stop
+        self.stopped = False
+        self.nodes = 0
+        self.elapsed = 0
+        self.game_keys = set(game_keys)
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [0] * (64 * 64)
+        self.pv_table = [[0] * MAX_PLY for _ in range(MAX_PLY)]
+        self.pv_length = [0] * MAX_PLY
+        self.previous_pv = []
+        self.table.new_search()
+        root_moves = position.legal_moves()
+        if not root_moves:
+            return None, 0, 0
+        best_move, best_score, completed_depth = root_moves[0], 0, 0
+        history_length = len(position.history)
+        for depth in range(min(start_depth, self.max_depth), self.max_depth + 1):
+            self.seen_keys = set()
+            try:
+                score = self.negamax(position, depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                while len(position.history) > history_length:
+                    position.unmake_move()
+                break
+            self.previous_pv = self.pv_table[0][:self.pv_length[0]]
+            if self.previous_pv:
+                best_move = self.previous_pv[0]
+            best_score, completed_depth = score, depth
+            self.elapsed = time.perf_counter() - start
+            if on_iteration is not None:
+                on_iteration(depth, score, list(self.previous_pv), self.nodes, self.nps)
+            if len(root_moves) == 1 or abs(score) >= MATE_SCORE - MAX_PLY:
+                break
+        self.elapsed = time.perf_counter() - start
+        return best_move, best_score, completed_depth
+
+    def check_clock(self):
+        if self.stopped or time.perf_counter() >= self.deadline:
+            raise SearchTimeout
+        if self.should_stop is not None and self.should_stop():
+            raise SearchTimeout
+
+    def order_moves(self, position, moves, ply, tt_move=0):
+        mailbox = position.mailbox
+        pv_move = self.previous_pv[ply] if ply < len(self.previous_pv) else None
+        killers = self.killers[ply]
+        history = self.history
+
+        def move_order(move):
+            if move == tt_move:
+                return 4000000
+            if move == pv_move:
+                return 3000000
+            from_sq = move & 63
+            to_sq = move >> 6 & 63
+            captured = mailbox[to_sq]
+            flag = move >> 12 & 7
+            if captured is not None or flag == EN_PASSANT:
+                victim = PAWN if captured is None else captured % 6
+                return 2000000 + PIECE_VALUES[victim] * 10 - PIECE_VALUES[mailbox[from_sq] % 6] // 10
+            if flag == PROMOTION:
+                return 1900000 + PIECE_VALUES[move_promotion(move)]
+            if move == killers[0] or move == killers[1]:
+                return 1000000
+            return history[from_sq * 64 + to_sq]
+
+        moves.sort(key=move_order, reverse=True)
+        return moves
+
+    def negamax(self, position, depth, alpha, beta, ply):
+        self.pv_length[ply] = ply
+        key = position.key
+        if ply and (position.halfmove_clock >= 100 or key in self.seen_keys or key in self.game_keys):
+            return 0
+        in_check = position.in_check(position.side)
+        if in_check:
+            depth += 1
+        if depth <= 0:
+            return self.quiescence(position, alpha, beta, ply)
+        self.nodes += 1
+        if not self.nodes % ChessAI.NODES_BETWEEN_CLOCK_CHECKS:
+            self.check_clock()
+        tt_move = 0
+        entry = self.table.probe(key)
+        if entry is not None:
+            tt_move, tt_depth, bound, tt_score = entry
+            if ply and tt_depth >= depth:
+                tt_score = score_from_table(tt_score, ply)
+                if (
+                    bound == TranspositionTable.EXACT or
+                    (bound == TranspositionTable.LOWER and tt_score >= beta) or
+                    (bound == TranspositionTable.UPPER and tt_score <= alpha)
+                ):
+                    return tt_score
+        moves = position.legal_moves()
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+        if ply >= MAX_PLY - 1:
+            return evaluate(position)
+        self.seen_keys.add(key)
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = 0
+        for move in self.order_moves(position, moves, ply, tt_move):
+            position.make_move(move)
+            score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+                self.pv_table[ply][ply] = move
+                next_length = self.pv_length[ply + 1]
+                self.pv_table[ply][ply + 1:next_length] = self.pv_table[ply + 1][ply + 1:next_length]
+                self.pv_length[ply] = max(next_length, ply + 1)
+                if alpha >= beta:
+                    if not is_tactical(position, move):
+                        if move != self.killers[ply][0]:
+                            self.killers[ply][1] = self.killers[ply][0]
+                            self.killers[ply][0] = move
+                        self.history[(move & 63) * 64 + (move >> 6 & 63)] += depth * depth
+                    break
+        self.seen_keys.discard(key)
+        if best_score >= beta:
+            bound = TranspositionTable.LOWER
+        elif best_score > original_alpha:
+            bound = TranspositionTable.EXACT
+        else:
+            bound = TranspositionTable.UPPER
+        self.table.store(key, best_move, depth, bound, score_to_table(best_score, ply))
+        return best_score
+
+    def quiescence(self, position, alpha, beta, ply):
+        self.pv_length[ply] = ply
+        self.nodes += 1
+        if not self.nodes % ChessAI.NODES_BETWEEN_CLOCK_CHECKS:
+            self.check_clock()
+        stand_pat = evaluate(position)
+        if ply >= MAX_PLY - 1 or stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        captures = [move for move in position.legal_moves() if is_tactical(position, move)]
+        for move in self.order_moves(position, captures, ply):
+            position.make_move(move)
+            score = -self.quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > alpha:
+                if score >= beta:
+                    return score
+                alpha = score
+        return alpha
+
+
+def move_to_uci(move):
+    from_rank, from_file = divmod(move & 63, FILES)
+    to_rank, to_file = divmod(move >> 6 & 63, FILES)
+    text = f'{chr(97 + from_file)}{8 - from_rank}{chr(97 + to_file)}{8 - to_rank}'
+    if move_flag(move) == PROMOTION:
+        text += 'pnbrqk'[move_promotion(move)]
+    return text
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search benchmark positions and report engine throughput.')
+    parser.add_argument('-t', '--time', type=float, default=2.0, help='seconds to search each position (default: 2)')
+    parser.add_argument('--hash', type=int, default=16, help='transposition table size in MB (default: 16)')
+    args = parser.parse_args()
+    ai = ChessAI(time_limit=args.time, hash_size_mb=args.hash)
+    total_nodes = 0
+    total_time = 0
+    for fen in BENCHMARK_POSITIONS:
+        position = Position()
+        position.load_fen_notation(fen)
+        move, score, depth = ai.search(position)
+        total_nodes += ai.nodes
+        total_time += ai.elapsed
+        table = ai.table
+        print(f'{fen}\n    bestmove {move_to_uci(move)} score {score} depth {depth} nodes {ai.nodes} nps {ai.nps:.0f}')
+        print(f'    hash hits {table.hits} misses {table.misses} collisions {table.collisions} full {table.hashfull()}/1000')
+    print(f'total: {total_nodes} nodes in {total_time:.3f}s ({total_nodes / total_time:.0f} nps)')
@@ -0,0 +1,526 @@
+from random import Random
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+RANKS = 8
+FILES = 8
+FULL_BOARD = (1 << RANKS * FILES) - 1
+NORMAL, DOUBLE_PUSH, EN_PASSANT, CASTLING, PROMOTION = range(5)
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+
+def square_index(rank, file):
+    return rank * FILES + file
+
+
+def encode_move(from_sq, to_sq, flag=NORMAL, promotion=0):
+    return from_sq | to_sq << 6 | flag << 12 | promotion << 15
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return move >> 6 & 63
+
+
+def move_flag(move):
+    return move >> 12 & 7
+
+
+def move_promotion(move):
+    return move >> 15
+
+
+def lsb(bitboard):
+    return (bitboard & -bitboard).bit_length() - 1
+
+
+def msb(bitboard):
+    return bitboard.bit_length() - 1
+
+
+def iter_bits(bitboard):
+    while bitboard:
+        low_bit = bitboard & -bitboard
+        yield low_bit.bit_length() - 1
+        bitboard ^= low_bit
+
+
+def _leaper_table(offsets):
+    table = []
+    for sq in range(RANKS * FILES):
+        rank, file = divmod(sq, FILES)
+        attacks = 0
+        for dr, df in offsets:
+            r, f = rank + dr, file + df
+            if 0 <= r < RANKS and 0 <= f < FILES:
+                attacks |= 1 << square_index(r, f)
+        table.append(attacks)
+    return tuple(table)
+
+
+def _ray_table(dr, df):
+    table = []
+    for sq in range(RANKS * FILES):
+        rank, file = divmod(sq, FILES)
+        ray = 0
+        r, f = rank + dr, file + df
+        while 0 <= r < RANKS and 0 <= f < FILES:
+            ray |= 1 << square_index(r, f)
+            r, f = r + dr, f + df
+        table.append(ray)
+    return tuple(table)
+
+
+KNIGHT_ATTACKS = _leaper_table(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = _leaper_table(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+# Rank 0 is the eighth rank, so white pawns attack towards lower rank indices.
+PAWN_ATTACKS = (
+    _leaper_table(((-1, -1), (-1, 1))),
+    _leaper_table(((1, -1), (1, 1)))
+)
+
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+RAYS = {direction: _ray_table(*direction) for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+# A ray runs towards higher square indices when its direction sorts after (0, 0),
+# in which case the nearest blocker is the lowest set bit rather than the highest.
+_ROOK_RAYS = tuple((RAYS[direction], direction > (0, 0)) for direction in ROOK_DIRECTIONS)
+_BISHOP_RAYS = tuple((RAYS[direction], direction > (0, 0)) for direction in BISHOP_DIRECTIONS)
+_PIN_RAYS = (
+    tuple((ray_table, ascending, ROOK) for ray_table, ascending in _ROOK_RAYS) +
+    tuple((ray_table, ascending, BISHOP) for ray_table, ascending in _BISHOP_RAYS)
+)
+
+
+def _between_table():
+    table = [[0] * (RANKS * FILES) for _ in range(RANKS * FILES)]
+    for dr, df in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+        for sq in range(RANKS * FILES):
+            rank, file = divmod(sq, FILES)
+            between = 0
+            r, f = rank + dr, file + df
+            while 0 <= r < RANKS and 0 <= f < FILES:
+                target = square_index(r, f)
+                table[sq][target] = between
+                between |= 1 << target
+                r, f = r + dr, f + df
+    return tuple(tuple(row) for row in table)
+
+
+BETWEEN = _between_table()
+PROMOTION_RANKS = (0, RANKS - 1)
+DOUBLE_PUSH_RANKS = (RANKS - 2, 1)
+PAWN_PUSH = (-FILES, FILES)
+# (right, king from, king to, rook square, squares that must be empty, squares that must be safe)
+CASTLING_MOVES = (
+    (
+        (WHITE_KINGSIDE, 60, 62, 63, (1 << 61) | (1 << 62), (61, 62)),
+        (WHITE_QUEENSIDE, 60, 58, 56, (1 << 57) | (1 << 58) | (1 << 59), (59, 58))
+    ),
+    (
+        (BLACK_KINGSIDE, 4, 6, 7, (1 << 5) | (1 << 6), (5, 6)),
+        (BLACK_QUEENSIDE, 4, 2, 0, (1 << 1) | (1 << 2) | (1 << 3), (3, 2))
+    )
+)
+CASTLING_ROOK_MOVES = {62: (63, 61), 58: (56, 59), 6: (7, 5), 2: (0, 3)}
+CASTLING_RIGHTS_KEPT = tuple(
+    15 & ~{
+        60: WHITE_KINGSIDE | WHITE_QUEENSIDE, 63: WHITE_KINGSIDE, 56: WHITE_QUEENSIDE,
+        4: BLACK_KINGSIDE | BLACK_QUEENSIDE, 7: BLACK_KINGSIDE, 0: BLACK_QUEENSIDE
+    }.get(sq, 0)
+    for sq in range(RANKS * FILES)
+)
+FEN_CASTLING = (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE), ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE))
+PIECE_LETTERS = 'PNBRQK'
+
+# Seeded so every process hashes positions identically.
+_zobrist_random = Random(2022)
+ZOBRIST_PIECES = tuple(_zobrist_random.getrandbits(64) for _ in range(12 * RANKS * FILES))
+ZOBRIST_SIDE = _zobrist_random.getrandbits(64)
+ZOBRIST_EP_FILES = tuple(_zobrist_random.getrandbits(64) for _ in range(FILES))
+
+
+def _castling_keys(right_keys):
+    keys = []
+    for rights in range(16):
+        key = 0
+        for i, right_key in enumerate(right_keys):
+            if rights >> i & 1:
+                key ^= right_key
+        keys.append(key)
+    return tuple(keys)
+
+
+ZOBRIST_CASTLING = _castling_keys([_zobrist_random.getrandbits(64) for _ in range(4)])
+
+
+def _slider_attacks(sq, occupancy, rays):
+    attacks = 0
+    for ray_table, ascending in rays:
+        ray = ray_table[sq]
+        blockers = ray & occupancy
+        if blockers:
+            blocker = lsb(blockers) if ascending else msb(blockers)
+            ray ^= ray_table[blocker]
+        attacks |= ray
+    return attacks
+
+
+def bishop_attacks(sq, occupancy):
+    return _slider_attacks(sq, occupancy, _BISHOP_RAYS)
+
+
+def rook_attacks(sq, occupancy):
+    return _slider_attacks(sq, occupancy, _ROOK_RAYS)
+
+
+def queen_attacks(sq, occupancy):
+    return _slider_attacks(sq, occupancy, _BISHOP_RAYS) | _slider_attacks(sq, occupancy, _ROOK_RAYS)
+
+
+class Position:
+    def __init__(self):
+        self.bitboards = [0] * 12
+        self.occupancy = [0, 0]
+        self.mailbox = [None] * (RANKS * FILES)
+        self.side = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.history = []
+        self.key = 0
+
+
+    def add_piece(self, sq, colour, kind):
+        code = colour * 6 + kind
+        bit = 1 << sq
+        self.bitboards[code] |= bit
+        self.occupancy[colour] |= bit
+        self.mailbox[sq] = code
+        self.key ^= ZOBRIST_PIECES[code * 64 + sq]
+
+    def remove_piece(self, sq):
+        code = self.mailbox[sq]
+        if code is None:
+            return None
+        bit = 1 << sq
+        self.bitboards[code] ^= bit
+        self.occupancy[code // 6] ^= bit
+        self.mailbox[sq] = None
+        self.key ^= ZOBRIST_PIECES[code * 64 + sq]
+        return code
+
+    def move_piece(self, from_sq, to_sq):
+        code = self.mailbox[from_sq]
+        move_bits = (1 << from_sq) | (1 << to_sq)
+        self.bitboards[code] ^= move_bits
+        self.occupancy[code // 6] ^= move_bits
+        self.mailbox[from_sq] = None
+        self.mailbox[to_sq] = code
+        self.key ^= ZOBRIST_PIECES[code * 64 + from_sq] ^ ZOBRIST_PIECES[code * 64 + to_sq]
+
+    def state_key(self):
+        key = ZOBRIST_CASTLING[self.castling]
+        if self.side == BLACK:
+            key ^= ZOBRIST_SIDE
+        if self.ep_square is not None:
+            key ^= ZOBRIST_EP_FILES[self.ep_square % FILES]
+        return key
+
+    def set_state(self, side, castling, ep_square):
+        # An en passant square only distinguishes positions when it can be captured on.
+        if ep_square is not None and not PAWN_ATTACKS[side ^ 1][ep_square] & self.bitboards[side * 6 + PAWN]:
+            ep_square = None
+        self.key ^= self.state_key()
+        self.side = side
+        self.castling = castling
+        self.ep_square = ep_square
+        self.key ^= self.state_key()
+
+    def copy(self):
+        position = Position()
+        position.bitboards = list(self.bitboards)
+        position.occupancy = list(self.occupancy)
+        position.mailbox = list(self.mailbox)
+        position.side = self.side
+        position.castling = self.castling
+        position.ep_square = self.ep_square
+        position.halfmove_clock = self.halfmove_clock
+        position.fullmove_number = self.fullmove_number
+        position.key = self.key
+        return position
+
+    def colour_at(self, sq):
+        code = self.mailbox[sq]
+        return None if code is None else code // 6
+
+    def kind_at(self, sq):
+        code = self.mailbox[sq]
+        return None if code is None else code % 6
+
+    def pieces(self, colour, kind):
+        return self.bitboards[colour * 6 + kind]
+
+    def all_occupancy(self):
+        return self.occupancy[WHITE] | self.occupancy[BLACK]
+
+    def king_square(self, colour):
+        kings = self.bitboards[colour * 6 + KING]
+        return lsb(kings) if kings else None
+
+    def attacks_from(self, sq, occupancy=None):
+        code = self.mailbox[sq]
+        if code is None:
+            return 0
+        if occupancy is None:
+            occupancy = self.occupancy[WHITE] | self.occupancy[BLACK]
+        colour, kind = divmod(code, 6)
+        if kind == PAWN:
+            return PAWN_ATTACKS[colour][sq]
+        if kind == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        if kind == BISHOP:
+            return bishop_attacks(sq, occupancy)
+        if kind == ROOK:
+            return rook_attacks(sq, occupancy)
+        if kind == QUEEN:
+            return queen_attacks(sq, occupancy)
+        return KING_ATTACKS[sq]
+
+    def attackers_to(self, sq, colour, occupancy=None):
+        if occupancy is None:
+            occupancy = self.occupancy[WHITE] | self.occupancy[BLACK]
+        bitboards = self.bitboards
+        base = colour * 6
+        diagonal = bitboards[base + BISHOP] | bitboards[base + QUEEN]
+        straight = bitboards[base + ROOK] | bitboards[base + QUEEN]
+        attackers = (
+            (PAWN_ATTACKS[colour ^ 1][sq] & bitboards[base + PAWN]) |
+            (KNIGHT_ATTACKS[sq] & bitboards[base + KNIGHT]) |
+            (KING_ATTACKS[sq] & bitboards[base + KING])
+        )
+        if diagonal:
+            attackers |= bishop_attacks(sq, occupancy) & diagonal
+        if straight:
+            attackers |= rook_attacks(sq, occupancy) & straight
+        return attackers
+
+    def is_attacked(self, sq, colour, occupancy=None):
+        return self.attackers_to(sq, colour, occupancy) != 0
+
+    def in_check(self, colour):
+        king_sq = self.king_square(colour)
+        if king_sq is None:
+            return False
+        return self.is_attacked(king_sq, colour ^ 1)
+
+    def move_leaves_king_safe(self, from_sq, to_sq, captured_sq=None):
+        colour, kind = divmod(self.mailbox[from_sq], 6)
+        if captured_sq is None:
+            captured_sq = to_sq
+        occupancy = self.occupancy[WHITE] | self.occupancy[BLACK]
+        occupancy = (occupancy & ~(1 << from_sq) & ~(1 << captured_sq)) | (1 << to_sq)
+        king_sq = to_sq if kind == KING else self.king_square(colour)
+        if king_sq is None:
+            return True
+        attackers = self.attackers_to(king_sq, colour ^ 1, occupancy)
+        return not attackers & ~(1 << captured_sq)
+
+    def pinned_pieces(self, colour, king_sq, occupancy):
+        pins = {}
+        own = self.occupancy[colour]
+        base = (colour ^ 1) * 6
+        bitboards = self.bitboards
+        queens = bitboards[base + QUEEN]
+        sliders_by_kind = {ROOK: bitboards[base + ROOK] | queens, BISHOP: bitboards[base + BISHOP] | queens}
+        for ray_table, ascending, kind in _PIN_RAYS:
+            sliders = sliders_by_kind[kind]
+            ray = ray_table[king_sq]
+            if not ray & sliders:
+                continue
+            blockers = ray & occupancy
+            first = lsb(blockers) if ascending else msb(blockers)
+            if not own >> first & 1:
+                continue
+            blockers ^= 1 << first
+            if not blockers:
+                continue
+            second = lsb(blockers) if ascending else msb(blockers)
+            if sliders >> second & 1:
+                pins[first] = BETWEEN[king_sq][second] | 1 << second
+        return pins
+
+    def legal_moves(self, colour=None):
+        if colour is None:
+            colour = self.side
+        enemy = colour ^ 1
+        bitboards = self.bitboards
+        base = colour * 6
+        own = self.occupancy[colour]
+        theirs = self.occupancy[enemy]
+        occupancy = own | theirs
+        enemy_king = bitboards[enemy * 6 + KING]
+        moves = []
+        append = moves.append
+
+        king_sq = self.king_square(colour)
+        check_mask = FULL_BOARD
+        pins = {}
+        if king_sq is not None:
+            without_king = occupancy ^ (1 << king_sq)
+            for to_sq in iter_bits(KING_ATTACKS[king_sq] & ~own & ~enemy_king):
+                if not self.attackers_to(to_sq, enemy, without_king):
+                    append(king_sq | to_sq << 6)
+            checkers = self.attackers_to(king_sq, enemy, occupancy)
+            if checkers & (checkers - 1):
+                return moves
+            if checkers:
+                check_mask = checkers | BETWEEN[king_sq][lsb(checkers)]
+            else:
+                for right, king_from, king_to, rook_sq, empty, safe in CASTLING_MOVES[colour]:
+                    if (
+                        self.castling & right and
+                        king_from == king_sq and
+                        bitboards[base + ROOK] >> rook_sq & 1 and
+                        not occupancy & empty and
+                        not self.is_attacked(safe[0], enemy, occupancy) and
+                        not self.is_attacked(safe[1], enemy, occupancy)
+                    ):
+                        append(king_from | king_to << 6 | CASTLING << 12)
+            pins = self.pinned_pieces(colour, king_sq, occupancy)
+
+        target_mask = FULL_BOARD & ~own & ~enemy_king & check_mask
+        for from_sq in iter_bits(bitboards[base + KNIGHT]):
+            if from_sq in pins:
+                continue
+            for to_sq in iter_bits(KNIGHT_ATTACKS[from_sq] & target_mask):
+                append(from_sq | to_sq << 6)
+        for kind, attacks in ((BISHOP, bishop_attacks), (ROOK, rook_attacks), (QUEEN, queen_attacks)):
+            for from_sq in iter_bits(bitboards[base + kind]):
+                mask = target_mask & pins.get(from_sq, FULL_BOARD)
+                for to_sq in iter_bits(attacks(from_sq, occupancy) & mask):
+                    append(from_sq | to_sq << 6)
+
+        push = PAWN_PUSH[colour]
+        promotion_rank = PROMOTION_RANKS[colour]
+        double_push_rank = DOUBLE_PUSH_RANKS[colour]
+        capturable = theirs & ~enemy_king
+        ep_square = self.ep_square
+        for from_sq in iter_bits(bitboards[base + PAWN]):
+            mask = check_mask & pins.get(from_sq, FULL_BOARD)
+            targets = PAWN_ATTACKS[colour][from_sq] & capturable & mask
+            single = from_sq + push
+            if not occupancy >> single & 1:
+                if mask >> single & 1:
+                    targets |= 1 << single
+                double = single + push
+                if from_sq // FILES == double_push_rank and not occupancy >> double & 1 and mask >> double & 1:
+                    append(from_sq | double << 6 | DOUBLE_PUSH << 12)
+            for to_sq in iter_bits(targets):
+                if to_sq // FILES == promotion_rank:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        append(from_sq | to_sq << 6 | PROMOTION << 12 | promotion << 15)
+                else:
+                    append(from_sq | to_sq << 6)
+            if ep_square is not None and PAWN_ATTACKS[colour][from_sq] >> ep_square & 1:
+                captured_sq = ep_square - push
+                if (
+                    bitboards[enemy * 6 + PAWN] >> captured_sq & 1 and
+                    self.move_leaves_king_safe(from_sq, ep_square, captured_sq)
+                ):
+                    append(from_sq | ep_square << 6 | EN_PASSANT << 12)
+        return moves
+
+    def make_move(self, move):
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        flag = move >> 12 & 7
+        colour = self.side
+        mailbox = self.mailbox
+        moving = mailbox[from_sq]
+        key = self.key
+        if flag == EN_PASSANT:
+            captured = self.remove_piece(to_sq - PAWN_PUSH[colour])
+        else:
+            captured = self.remove_piece(to_sq)
+        self.history.append((move, captured, self.castling, self.ep_square, self.halfmove_clock, key))
+        self.move_piece(from_sq, to_sq)
+        if flag == PROMOTION:
+            self.remove_piece(to_sq)
+            self.add_piece(to_sq, colour, move >> 15)
+        elif flag == CASTLING:
+            self.move_piece(*CASTLING_ROOK_MOVES[to_sq])
+        ep_square = from_sq + PAWN_PUSH[colour] if flag == DOUBLE_PUSH else None
+        self.set_state(colour ^ 1, self.castling & CASTLING_RIGHTS_KEPT[from_sq] & CASTLING_RIGHTS_KEPT[to_sq], ep_square)
+        if captured is not None or moving % 6 == PAWN:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if colour == BLACK:
+            self.fullmove_number += 1
+
+    def unmake_move(self):
+        move, captured, castling, ep_square, halfmove_clock, key = self.history.pop()
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        flag = move >> 12 & 7
+        colour = self.side ^ 1
+        self.side = colour
+        if colour == BLACK:
+            self.fullmove_number -= 1
+        if flag == PROMOTION:
+            self.remove_piece(to_sq)
+            self.add_piece(to_sq, colour, PAWN)
+        elif flag == CASTLING:
+            rook_from, rook_to = CASTLING_ROOK_MOVES[to_sq]
+            self.move_piece(rook_to, rook_from)
+        self.move_piece(to_sq, from_sq)
+        if captured is not None:
+            captured_sq = to_sq - PAWN_PUSH[colour] if flag == EN_PASSANT else to_sq
+            self.add_piece(captured_sq, *divmod(captured, 6))
+        self.castling = castling
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self.key = key
+
+    def load_fen_notation(self, fen_notation):
+        board, turn, castling, en_passant, halfmove, fullmove = fen_notation.split()
+        turn = turn.lower()
+        if turn not in 'wb':
+            raise ValueError(f'Invalid player value. Must be one of (w, b), not {turn}')
+        self.bitboards = [0] * 12
+        self.occupancy = [0, 0]
+        self.mailbox = [None] * (RANKS * FILES)
+        self.side = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.history = []
+        self.key = 0
+        for rank_index, rank in enumerate(board.split('/')):
+            current_file_index = 0
+            for char in rank:
+                if char.isnumeric():
+                    if int(char) not in range(1, 9):
+                        raise ValueError(f'Invalid number of empty squares: {char}')
+                    current_file_index += int(char)
+                else:
+                    if char.lower() not in 'kqbrnp':
+                        raise ValueError(f'Invalid piece notation: {char}')
+                    colour = WHITE if char.isupper() else BLACK
+                    self.add_piece(square_index(rank_index, current_file_index), colour, PIECE_LETTERS.index(char.upper()))
+                    current_file_index += 1
+        side = WHITE if turn == 'w' else BLACK
+        castling_rights = 0
+        for letter, right in FEN_CASTLING:
+            if letter in castling:
+                castling_rights |= right
+        ep_square = None
+        if en_passant != '-':
+            ep_square = square_index(RANKS - int(en_passant[1]), ord(en_passant[0]) - 97)
+        self.set_state(side, castling_rights, ep_square)
+        self.halfmove_clock = int(halfmove)
+        self.fullmove_number = int(fullmove)
@@ -1,12 +1,13 @@
-from Tetris import Tetris, GoalType, PlacementType
+from Assets import assets, asset_path, startup
+from Tetris import Tetris, GoalType, PlacementType, TetriminoImage
 from Tetris import Sounds as TetrisSounds
-from Chess import Chess, Team
+from Chess import Chess, Team, PieceImage
 from Chess import Square as ChessSquare
 
 import tkinter as tk
+import argparse
 import os
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
-from pygame import mixer
 
 class Chesstris:
     def __init__(self, parent, chess, white_tetris, black_tetris):
@@ -36,6 +37,12 @@ class Chesstris:
         self.black_tetris.lines_cleared_flag = tk.IntVar(self.parent, value=-1)
         self.black_lines_cleared_flag_id = self.black_tetris.lines_cleared_flag.trace_add('write', self._black_line_trace)
 
+        self.white_tetris.garbage_sent_flag = tk.IntVar(self.parent, value=0)
+        self.white_garbage_sent_flag_id = self.white_tetris.garbage_sent_flag.trace_add('write', self._white_garbage_trace)
+
+        self.black_tetris.garbage_sent_flag = tk.IntVar(self.parent, value=0)
+        self.black_garbage_sent_flag_id = self.black_tetris.garbage_sent_flag.trace_add('write', self._black_garbage_trace)
+
     def _white_line_trace(self, *args):
         if self.white_tetris.lines_cleared_flag.get() > 0:
             self.chess.change_player(override=Team.WHITE)
@@ -46,6 +53,13 @@ class Chesstris:
             self.chess.change_player(override=Team.BLACK)
             self.swap_games()
 
+    def _white_garbage_trace(self, *args):
+        # Queued only; the black board takes it all at once when its next piece spawns.
+        self.black_tetris.queue_garbage(self.white_tetris.garbage_sent_flag.get())
+
+    def _black_garbage_trace(self, *args):
+        self.white_tetris.queue_garbage(self.black_tetris.garbage_sent_flag.get())
+
     def _chess_move_trace(self, *args):
         self.swap_games()
 
@@ -116,7 +130,7 @@ class Chesstris:
 
         def display_countdown():
             text = countdowns.pop(0)
-            countdown.config(image=self._make_text_label(None, text, Tetris.UI_FONT_SIZE).cget('image'))
+            self.white_tetris._show_text(countdown, text)
             if text == 'GO!':
                 self.white_tetris.move_channel.play(TetrisSounds.GO)
             else:
@@ -170,14 +184,34 @@ class Chesstris:
 
 
 if __name__ == '__main__':
+    startup.mark('imports')
+    parser = argparse.ArgumentParser(description='Play Chesstris.')
+    parser.add_argument('-t', '--timings', action='store_true', help='print a startup timing breakdown once the first frame is drawn')
+    parser.add_argument('-s', '--seed', type=int, default=None, help='seed for both Tetris boards, which then get the same pieces (default: random)')
+    parser.add_argument('-r', '--record', metavar='PATH', default=None, help='record each Tetris board\'s inputs for TetrisReplay.py, to PATH with _white and _black added to the name')
+    parser.add_argument('-c', '--computer', action='append', choices=['white', 'black'], default=[], help='let the computer play this side of the chess board, repeat for both (default: none)')
+    parser.add_argument('--computer-white', action='store_true', help='let the computer play the white Tetris board')
+    parser.add_argument('--computer-black', action='store_true', help='let the computer play the black Tetris board')
+    parser.add_argument('--computer-time', type=float, default=1.0, help='seconds the chess computer may think per move (default: 1.0)')
+    args = parser.parse_args()
+    record_paths = {'white': None, 'black': None}
+    if args.record is not None:
+        name, extension = os.path.splitext(args.record)
+        record_paths = {team: f'{name}_{team}{extension}' for team in record_paths}
+    assets.prefetch(
+        [mino.value for mino in TetriminoImage] + [name for piece in PieceImage for name in piece.value]
+    )
+    from pygame import mixer
     mixer.pre_init(buffer=4096)
     mixer.init()
+    TetrisSounds.load_in_background()
     tetris_music = mixer.Channel(0)
     tetris_w_move = mixer.Channel(1)
     tetris_w_line = mixer.Channel(2)
     tetris_b_move = mixer.Channel(3)
     tetris_b_line = mixer.Channel(4)
     chess_sound = mixer.Channel(5)
+    startup.mark('mixer')
 
     root = tk.Tk()
     root.resizable(0, 0)
@@ -224,7 +258,10 @@ if __name__ == '__main__':
         line_channel=tetris_w_line,
         start_menu=False,
         allow_play_again=False,
-        show_game_over_screen=False
+        show_game_over_screen=False,
+        computer_player=args.computer_white,
+        seed=args.seed,
+        record_path=record_paths['white']
     )
     tetris_black = Tetris(
         parent=tetris_b_frame,
@@ -240,19 +277,34 @@ if __name__ == '__main__':
         line_channel=tetris_b_line,
         start_menu=False,
         allow_play_again=False,
-        show_game_over_screen=False
+        show_game_over_screen=False,
+        computer_player=args.computer_black,
+        seed=args.seed,
+        record_path=record_paths['black']
     )
     chess = Chess(
         parent=chess_frame,
-        square_sheet='assets/chess/squares.png',
+        square_sheet=asset_path('chess/squares.png'),
         sound_channel=chess_sound,
         flip_after_move=False,
         allow_play_again=False,
-        show_game_over_screen=False
+        show_game_over_screen=False,
+        computer_players=tuple(Team[name.upper()] for name in args.computer),
+        computer_time_limit=args.computer_time
     )
     chesstris = Chesstris(chesstris_frame, chess, tetris_white, tetris_black)
+
+    def close():
+        # Games usually end on the chess board or by closing the window, so the recordings are saved here.
+        tetris_white.save_recording()
+        tetris_black.save_recording()
+        root.destroy()
+
+    root.protocol('WM_DELETE_WINDOW', close)
     tetris_w_frame.grid(row=0, column=0)
     tetris_b_frame.grid(row=0, column=2)
     chess_frame.grid(row=0, column=1)
     chesstris_frame.grid(row=0, column=0)
+    startup.mark('widgets')
+    startup.mark_first_frame(root, args.timings)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,95 @@
+import multiprocessing
+import queue
+from ChessAI import ChessAI
+from ChessEngine import Position
+
+
+def _engine_worker(requests, results, current_search, time_limit, hash_size_mb):
+    ai = ChessAI(time_limit=time_limit, hash_size_mb=hash_size_mb)
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        search_id, fen, game_keys, search_time = request
+        if current_search.value != search_id:
+            continue
+        position = Position()
+        position.load_fen_notation(fen)
+
+        def on_iteration(depth, score, pv, nodes, nps):
+            results.put(('info', search_id, depth, score, pv, nodes, nps))
+
+        move, score, depth = ai.search(
+            position,
+            time_limit=search_time,
+            game_keys=game_keys,
+            on_iteration=on_iteration,
+            should_stop=lambda: current_search.value != search_id
+        )
+        results.put(('bestmove', search_id, move, score, depth))
+
+
+class EngineService:
+    # Searches on a single core; ParallelSearch is a benchmark and is not used here.
+    def __init__(self, time_limit=1.0, hash_size_mb=16):
+        self.time_limit = time_limit
+        self.hash_size_mb = hash_size_mb
+        # Spawn rather than fork so the worker never inherits Tk or mixer state.
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.requests = None
+        self.results = None
+        self.current_search = None
+        self.last_search_id = 0
+
+    @property
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        if self.is_alive:
+            return
+        self.requests = self.context.Queue()
+        self.results = self.context.Queue()
+        self.current_search = self.context.Value('q', 0)
+        self.process = self.context.Process(
+            target=_engine_worker,
+            args=(self.requests, self.results, self.current_search, self.time_limit, self.hash_size_mb),
+            daemon=True
+        )
+        self.process.start()
+
+    def search(self, fen, game_keys=(), time_limit=None):
+        self.start()
+        self.last_search_id += 1
+        self.current_search.value = self.last_search_id
+        self.requests.put((self.last_search_id, fen, set(game_keys), time_limit))
+        return self.last_search_id
+
+    def cancel(self):
+        if self.current_search is not None:
+            self.current_search.value = 0
+
+    def poll(self):
+        messages = []
+        if self.results is None:
+            return messages
+        while True:
+            try:
+                messages.append(self.results.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def close(self):
+        if self.process is None:
+            return
+        self.cancel()
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+        self.requests = None
+        self.results = None
+        self.current_search = None
@@ -0,0 +1,130 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from ChessAI import ChessAI, TranspositionTable, BENCHMARK_POSITIONS, MAX_PLY, move_to_uci
+from ChessEngine import Position
+
+
+_worker_ai = None
+_worker_memory = None
+_worker_generation = None
+
+
+def _init_worker(memory_name, hash_size_mb, generation):
+    global _worker_ai, _worker_memory, _worker_generation
+    _worker_memory = SharedMemory(name=memory_name)
+    _worker_generation = generation
+    _worker_ai = ChessAI(table=TranspositionTable(hash_size_mb, buffer=_worker_memory.buf))
+
+
+def _search_worker(fen, time_limit, max_depth, game_keys, generation, start_depth):
+    position = Position()
+    position.load_fen_notation(fen)
+    _worker_ai.max_depth = max_depth
+    move, score, depth = _worker_ai.search(
+        position,
+        time_limit=time_limit,
+        game_keys=game_keys,
+        should_stop=lambda: _worker_generation.value != generation,
+        start_depth=start_depth
+    )
+    return move, score, depth, _worker_ai.nodes
+
+
+class ParallelSearch:
+    # Only used by the benchmark below. The game's computer player still searches on one core through
+    # EngineService, whose worker is a daemon process and so cannot start this pool. Wiring it in should
+    # wait until this benchmark shows a time-to-depth speedup on a multi-core machine.
+    def __init__(self, workers=None, time_limit=1.0, max_depth=MAX_PLY - 1, hash_size_mb=16):
+        self.workers = workers or os.cpu_count() or 1
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.hash_size_mb = hash_size_mb
+        context = multiprocessing.get_context('spawn')
+        self.memory = SharedMemory(create=True, size=TranspositionTable.table_bytes(hash_size_mb))
+        self.generation = context.Value('q', 0)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.memory.name, hash_size_mb, self.generation)
+        )
+        self.nodes = 0
+        self.elapsed = 0
+
+    @property
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed else 0
+
+    def clear(self):
+        self.memory.buf[:] = bytes(len(self.memory.buf))
+
+    def search(self, fen, time_limit=None, max_depth=None, game_keys=()):
+        start = time.perf_counter()
+        self.generation.value += 1
+        generation = self.generation.value
+        time_limit = self.time_limit if time_limit is None else time_limit
+        max_depth = self.max_depth if max_depth is None else max_depth
+        game_keys = set(game_keys)
+        # Lazy SMP: every worker searches the whole tree and they share work through the table.
+        # Odd helpers start one ply deeper so the workers do not walk the tree in lockstep.
+        futures = [
+            self.executor.submit(_search_worker, fen, time_limit, max_depth, game_keys, generation, 1 + worker % 2)
+            for worker in range(self.workers)
+        ]
+        main_result = futures[0].result()
+        # Moving on to a generation no search uses stops the helpers; the counter never goes back,
+        # so a stale helper can always be told apart from a current one.
+        self.generation.value += 1
+        wait(futures)
+        self.elapsed = time.perf_counter() - start
+        results = [main_result] + [future.result() for future in futures[1:]]
+        self.nodes = sum(result[3] for result in results)
+        best_move, best_score, best_depth, _ = main_result
+        for move, score, depth, _ in results[1:]:
+            if depth > best_depth and move is not None:
+                best_move, best_score, best_depth = move, score, depth
+        return best_move, best_score, best_depth
+
+    def close(self):
+        self.executor.shutdown()
+        self.memory.close()
+        self.memory.unlink()
+
+
+def run_benchmark(worker_counts, depth, hash_size_mb):
+    cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    baseline = None
+    for workers in worker_counts:
+        if workers > cpu_count:
+            print(f'workers {workers:>3} share {cpu_count} core(s), so their speedup says nothing about parallel scaling')
+        search = ParallelSearch(workers=workers, time_limit=float('inf'), max_depth=depth, hash_size_mb=hash_size_mb)
+        total_nodes = 0
+        total_time = 0
+        try:
+            # Warm the pool up so process start-up is not counted.
+            search.search(BENCHMARK_POSITIONS[0], max_depth=1)
+            for fen in BENCHMARK_POSITIONS:
+                search.clear()
+                move, score, completed_depth = search.search(fen)
+                total_nodes += search.nodes
+                total_time += search.elapsed
+                print(f'workers {workers:>3} depth {completed_depth} bestmove {move_to_uci(move)} score {score:>6} nodes {search.nodes:>9} time {search.elapsed:.3f}s')
+        finally:
+            search.close()
+        if baseline is None:
+            baseline = total_time
+        print(f'workers {workers:>3} total: {total_nodes} nodes in {total_time:.3f}s ({total_nodes / total_time:.0f} nps), speedup {baseline / total_time:.2f}x')
+
+
+if __name__ == '__main__':
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Measure time-to-depth speedup of the parallel search on the benchmark positions.')
+    parser.add_argument('-d', '--depth', type=int, default=4, help='depth to search each position to (default: 4)')
+    parser.add_argument('-w', '--workers', type=int, nargs='+', default=sorted({1, 2, 4, cpu_count}), help=f'worker counts to compare (default: 1 2 4 {cpu_count})')
+    parser.add_argument('--hash', type=int, default=16, help='shared transposition table size in MB (default: 16)')
+    args = parser.parse_args()
+    run_benchmark(args.workers, args.depth, args.hash)
@@ -0,0 +1,79 @@
+import argparse
+import sys
+import time
+from ChessEngine import Position
+
+
+PERFT_SUITE = {
+    'startpos': (
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+        (20, 400, 8902, 197281, 4865609)
+    ),
+    'kiwipete': (
+        'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+        (48, 2039, 97862, 4085603)
+    ),
+    'position3': (
+        '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+        (14, 191, 2812, 43238, 674624)
+    ),
+    'position4': (
+        'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+        (6, 264, 9467, 422333)
+    ),
+    'position5': (
+        'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+        (44, 1486, 62379, 2103487)
+    ),
+    'position6': (
+        'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+        (46, 2079, 89890, 3894594)
+    ),
+}
+
+
+def perft(position, depth):
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def run_suite(names, depth):
+    failures = 0
+    total_nodes = 0
+    total_time = 0
+    for name in names:
+        fen, expected_counts = PERFT_SUITE[name]
+        position = Position()
+        position.load_fen_notation(fen)
+        for d in range(1, min(depth, len(expected_counts)) + 1):
+            start = time.perf_counter()
+            nodes = perft(position, d)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            expected = expected_counts[d - 1]
+            status = 'ok' if nodes == expected else f'FAIL (expected {expected})'
+            failures += nodes != expected
+            nps = nodes / elapsed if elapsed else 0
+            print(f'{name:<10} depth {d}: {nodes:>9} nodes {elapsed:8.3f}s {nps:>10.0f} nps  {status}')
+    nps = total_nodes / total_time if total_time else 0
+    print(f'total: {total_nodes} nodes in {total_time:.3f}s ({nps:.0f} nps), {failures} failure(s)')
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count perft leaf nodes for the chess rules engine.')
+    parser.add_argument('-d', '--depth', type=int, default=3, help='maximum depth to search (default: 3)')
+    parser.add_argument('positions', nargs='*', help=f'positions to run (default: all of {", ".join(PERFT_SUITE)})')
+    args = parser.parse_args()
+    for name in args.positions:
+        if name not in PERFT_SUITE:
+            parser.error(f'Unknown position: {name}. Must be one of: {", ".join(PERFT_SUITE)}')
+    sys.exit(1 if run_suite(args.positions or list(PERFT_SUITE), args.depth) else 0)
@@ -0,0 +1,67 @@
+import threading
+import time
+
+
+class SoundBank:
+    def __init__(self, paths):
+        self.paths = dict(paths)
+        self.sounds = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0
+
+    def __getattr__(self, name):
+        paths = self.__dict__.get('paths')
+        if paths is None or name not in paths:
+            raise AttributeError(name)
+        sound = self.sounds.get(name)
+        if sound is not None:
+            self.hits += 1
+            return sound
+        self.misses += 1
+        return self._load_sound(name)
+
+    def _load_sound(self, name):
+        # The mixer has to be initialised before anything can be decoded. pygame is a good part of
+        # start-up time to import, so it waits for the first sound rather than the first import.
+        from pygame import mixer
+        with self.lock:
+            sound = self.sounds.get(name)
+            if sound is None:
+                start = time.perf_counter()
+                sound = mixer.Sound(file=self.paths[name])
+                self.load_time += time.perf_counter() - start
+                self.sounds[name] = sound
+                self.errors.pop(name, None)
+            return sound
+
+    def load(self):
+        import pygame
+        for name in self.paths:
+            try:
+                self._load_sound(name)
+            except (OSError, pygame.error) as error:
+                # Left for the first access to retry, which raises the error where the sound is needed.
+                self.errors[name] = error
+
+    def load_in_background(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.load, daemon=True)
+            self.thread.start()
+        return self.thread
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def report(self):
+        return {
+            'loaded': len(self.sounds),
+            'failed': len(self.errors),
+            'hits': self.hits,
+            'misses': self.misses,
+            'load_ms': self.load_time * 1000
+        }
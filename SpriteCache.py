@@ -0,0 +1,41 @@
+from PIL import ImageOps, ImageTk
+
+
+class SpriteCache:
+    def __init__(self):
+        # PIL images are unhashable, so composites are keyed by the ids of their source images.
+        # The sources are kept alive here so those ids can never be reused by other images.
+        self.images = {}
+        self.sources = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, background, highlight=None, sprite=None, offset=(0, 0)):
+        key = id(background), highlight, id(sprite), offset
+        tk_image = self.images.get(key)
+        if tk_image is not None:
+            self.hits += 1
+            return tk_image
+        self.misses += 1
+        if highlight is not None:
+            composite = ImageOps.colorize(
+                ImageOps.grayscale(background),
+                black=tuple(int(.3 * c) for c in highlight),
+                white=tuple(min(c+100, 255) for c in highlight)
+            )
+        else:
+            composite = background.copy()
+        if sprite is not None:
+            composite.paste(sprite, offset, sprite)
+            self.sources[id(sprite)] = sprite
+        self.sources[id(background)] = background
+        tk_image = ImageTk.PhotoImage(composite)
+        self.images[key] = tk_image
+        return tk_image
+
+    def clear(self):
+        self.images.clear()
+        self.sources.clear()
+
+
+sprite_cache = SpriteCache()
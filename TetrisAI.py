@@ -0,0 +1,275 @@
+import argparse
+import time
+from collections import deque
+from TetrisEngine import (
+    PlacementType, GoalType, TetriminoType, Action, Tetrimino, TetrisState,
+    ROTATION_ORDER, NEXT_ROTATION_STATES, PIECE_SHAPES, PIECE_PROFILES, WALL_KICKS
+)
+
+
+ROTATIONS = ((Action.ROTATE_CLOCKWISE, True), (Action.ROTATE_COUNTERCLOCKWISE, False))
+TOP_OUT_SCORE = -1000000
+
+
+class TetrisAI:
+    # Board features are weighed against each other, so only their ratios matter.
+    WEIGHTS = {
+        'aggregate_height': -0.51,
+        'holes': -0.36,
+        'bumpiness': -0.18,
+        'lines': 0.76,
+        't_spin': 1.2,
+        'mini_t_spin': 0.2
+    }
+
+    def __init__(self, weights=None, actions=None):
+        self.weights = dict(TetrisAI.WEIGHTS)
+        if weights is not None:
+            self.weights.update(weights)
+        self.actions = set(Action) if actions is None else set(actions)
+        # The search keys positions by rotation index rather than RotationState, since hashing enums is slow.
+        self.tables = {}
+        for piece_type in TetriminoType:
+            shapes = tuple(PIECE_SHAPES[piece_type, rotation] for rotation in ROTATION_ORDER)
+            profiles = tuple(PIECE_PROFILES[piece_type, rotation] for rotation in ROTATION_ORDER)
+            turns = []
+            for rotation in ROTATION_ORDER:
+                rotation_turns = []
+                for action, clockwise in ROTATIONS:
+                    if action in self.actions:
+                        next_rotation = NEXT_ROTATION_STATES[rotation, clockwise]
+                        rotation_turns.append((
+                            action, ROTATION_ORDER.index(next_rotation), WALL_KICKS[piece_type, rotation, next_rotation]
+                        ))
+                turns.append(tuple(rotation_turns))
+            self.tables[piece_type] = shapes, tuple(turns), profiles
+        self.shifts = tuple((action, dc) for action, dc in ((Action.LEFT, -1), (Action.RIGHT, 1)) if action in self.actions)
+        self.scratch = TetrisState()
+        self.nodes = 0
+        self.placements = 0
+        self.elapsed = 0
+
+    def choose(self, state):
+        # Returns (score, hold, path). path is a list of (action, (rotation, x, y)) pairs, each with the
+        # position the falling piece should be in afterwards; a SOFT_DROP step means holding soft drop
+        # until the piece reaches that position. A held piece's path starts from its spawn position.
+        start = time.perf_counter()
+        self.nodes = 0
+        self.placements = 0
+        best_score, best_path = self.best_placement(state, state.falling_tetrimino)
+        hold = False
+        if Action.HOLD in self.actions and not state.has_held:
+            hold_type = state.held_type if state.held_type is not None else state.next_tetriminos[0]
+            if hold_type is not state.falling_tetrimino.piece_type:
+                tetrimino = Tetrimino(hold_type, state.get_tetrimino_spawn_pos(hold_type))
+                if state.fits(tetrimino, dr=1):
+                    tetrimino.move_vertically(1, 1)
+                hold_score, hold_path = self.best_placement(state, tetrimino)
+                if hold_score > best_score:
+                    best_score, best_path, hold = hold_score, hold_path, True
+        self.elapsed = time.perf_counter() - start
+        return best_score, hold, best_path
+
+    def best_placement(self, state, tetrimino):
+        parents, landings, spins = self.search_placements(state, tetrimino)
+        shapes = self.tables[tetrimino.piece_type][0]
+        best_score = None
+        best_node = None
+        best_spin = False
+        seen = set()
+        for node in landings:
+            rotation, x, y = node
+            t_spin = mini_t_spin = False
+            if node in spins:
+                t_spin, mini_t_spin = self.detect_t_spin(state.board, node, spins[node][1])
+            if not (t_spin or mini_t_spin):
+                # Different rotations of I, S and Z can fill the same cells; those only need scoring once.
+                footprint = tuple(
+                    (y + row, mask << x if x >= 0 else mask >> -x)
+                    for row, mask in shapes[rotation][3]
+                )
+                if footprint in seen:
+                    continue
+                seen.add(footprint)
+            score = self.evaluate(state.board, shapes[rotation], node, t_spin, mini_t_spin)
+            if best_score is None or score > best_score:
+                best_score, best_node, best_spin = score, node, t_spin or mini_t_spin
+        if best_node is None:
+            return TOP_OUT_SCORE, []
+        return best_score, self.build_path(parents, spins, best_node, best_spin)
+
+    def search_placements(self, state, tetrimino):
+        piece_type = tetrimino.piece_type
+        shapes, turns, profiles = self.tables[piece_type]
+        shifts = self.shifts
+        can_spin = piece_type is TetriminoType.T
+        fits = state.shape_fits
+        landing_row = state.landing_row
+        x, y = tetrimino.upper_left_coords
+        start = ROTATION_ORDER.index(tetrimino.rotation_state), x, y
+        # Positions are (rotation index, x, y). parents: how each position was first reached.
+        # landings: positions the piece can lock in. spins: for T pieces, landings reached by a
+        # rotation, with the rotation point detect_t_spin needs.
+        parents = {start: None}
+        landings = []
+        spins = {}
+        queue = deque((start,))
+        while queue:
+            node = queue.popleft()
+            self.nodes += 1
+            rotation, x, y = node
+            shape = shapes[rotation]
+            drop = landing_row(shape, profiles[rotation], x, y)
+            if drop == y:
+                landings.append(node)
+            else:
+                next_node = rotation, x, drop
+                if next_node not in parents:
+                    parents[next_node] = node, Action.SOFT_DROP
+                    queue.append(next_node)
+            for action, dc in shifts:
+                if fits(shape, x + dc, y):
+                    next_node = rotation, x + dc, y
+                    if next_node not in parents:
+                        parents[next_node] = node, action
+                        queue.append(next_node)
+            for action, next_rotation, kicks in turns[rotation]:
+                next_shape = shapes[next_rotation]
+                for kick_num, (kick_x, kick_y) in enumerate(kicks):
+                    if fits(next_shape, x + kick_x, y + kick_y):
+                        next_node = next_rotation, x + kick_x, y + kick_y
+                        if next_node not in parents:
+                            parents[next_node] = node, action
+                            queue.append(next_node)
+                        if can_spin and next_node not in spins and not fits(next_shape, x + kick_x, y + kick_y + 1):
+                            spins[next_node] = (node, action), kick_num + 1
+                        break
+        return parents, landings, spins
+
+    def build_path(self, parents, spins, node, spin):
+        path = []
+        if spin:
+            # A spin has to lock where the rotation left it; a hard drop would lose the T-spin.
+            parent, action = spins[node][0]
+            path.append((action, node))
+            node = parent
+        else:
+            path.append((Action.HARD_DROP, node))
+            if parents[node] is not None and parents[node][1] is Action.SOFT_DROP:
+                node = parents[node][0]
+        while parents[node] is not None:
+            parent, action = parents[node]
+            path.append((action, node))
+            node = parent
+        path.reverse()
+        return [(action, (ROTATION_ORDER[rotation], x, y)) for action, (rotation, x, y) in path]
+
+    def detect_t_spin(self, board, node, rotation_point):
+        rotation, x, y = node
+        scratch = self.scratch
+        scratch.board = board
+        scratch.falling_tetrimino = Tetrimino(TetriminoType.T, (x, y))
+        scratch.falling_tetrimino.set_rotation(ROTATION_ORDER[rotation])
+        scratch.rotation_point = rotation_point
+        return scratch.detect_t_spin()
+
+    def evaluate(self, board, shape, node, t_spin=False, mini_t_spin=False):
+        self.placements += 1
+        _, x, y = node
+        _, _, bottom, row_masks = shape
+        if y + bottom < TetrisState.BUFFER_ROWS:
+            return TOP_OUT_SCORE
+        weights = self.weights
+        rows = board[:]
+        for row, mask in row_masks:
+            if y + row >= 0:
+                rows[y + row] |= mask << x if x >= 0 else mask >> -x
+        full_row = TetrisState.FULL_ROW
+        lines = 0
+        if any(rows[y + row] == full_row for row, _ in row_masks if y + row >= 0):
+            remaining = [mask for mask in rows if mask != full_row]
+            lines = len(rows) - len(remaining)
+            rows = remaining
+        score = 0
+        if t_spin:
+            score = weights['t_spin'] * (lines + 1)
+        elif mini_t_spin:
+            score = weights['mini_t_spin'] * (lines + 1)
+        height = len(rows)
+        heights = [0] * TetrisState.COLUMNS
+        covered = 0
+        holes = 0
+        for index, mask in enumerate(rows):
+            if covered:
+                holes += (covered & ~mask).bit_count()
+            new = mask & ~covered
+            if new:
+                covered |= new
+                while new:
+                    low = new & -new
+                    heights[low.bit_length() - 1] = height - index
+                    new ^= low
+        bumpiness = 0
+        for left, right in zip(heights, heights[1:]):
+            bumpiness += abs(left - right)
+        return (
+            score +
+            weights['aggregate_height'] * sum(heights) +
+            weights['holes'] * holes +
+            weights['bumpiness'] * bumpiness +
+            weights['lines'] * lines
+        )
+
+    def play_turn(self, state):
+        # Plays one piece on a headless state; the piece moves instantly between steps.
+        score, hold, path = self.choose(state)
+        if hold:
+            state.step((Action.HOLD,))
+            if state.game_over:
+                return score
+            score, _, path = self.choose(state)
+        tetrimino = state.falling_tetrimino
+        for action, (rotation, x, y) in path:
+            if action is Action.SOFT_DROP:
+                while not state.game_over and tetrimino.upper_left_coords[1] < y:
+                    state.step((Action.GRAVITY,))
+            else:
+                state.step((action,))
+        if state.falling_tetrimino is tetrimino:
+            state.step((Action.LOCK,))
+        return score
+
+
+def play_games(games, max_pieces, level, seed, weights=None):
+    ai = TetrisAI(weights)
+    interval = TetrisState(starting_level=level).gravity_interval()
+    decisions = []
+    total_pieces = 0
+    total_lines = 0
+    for game in range(games):
+        state = TetrisState(PlacementType.EXTENDED, level, GoalType.STAGNANT, seed + game)
+        state.start()
+        pieces = 0
+        while not state.game_over and pieces < max_pieces:
+            ai.play_turn(state)
+            decisions.append(ai.elapsed)
+            pieces += 1
+        total_pieces += pieces
+        total_lines += state.lines_cleared
+        print(f'game {game:>3} pieces {pieces:>5} lines {state.lines_cleared:>5} score {state.score:>8} {"topped out" if state.game_over else ""}')
+    decisions.sort()
+    mean = sum(decisions) / len(decisions) * 1000
+    worst = decisions[-1] * 1000
+    percentile = decisions[int(len(decisions) * 0.99)] * 1000
+    print(f'{total_pieces} pieces, {total_lines} lines ({total_lines / max(1, total_pieces):.3f} lines per piece, 0.4 at most)')
+    print(f'decision time mean {mean:.2f}ms p99 {percentile:.2f}ms max {worst:.2f}ms, level {level} gravity tick {interval}ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play headless Tetris games with the placement search and report decision times.')
+    parser.add_argument('-g', '--games', type=int, default=5, help='number of games to play (default: 5)')
+    parser.add_argument('-p', '--pieces', type=int, default=500, help='pieces per game before stopping it (default: 500)')
+    parser.add_argument('-l', '--level', type=int, default=TetrisState.MAX_LEVEL, help=f'level to play at (default: {TetrisState.MAX_LEVEL})')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='seed of the first game, later games count up from it (default: 0)')
+    args = parser.parse_args()
+    play_games(args.games, args.pieces, args.level, args.seed)
@@ -0,0 +1,1063 @@
+import argparse
+import time
+from enum import Enum, auto
+from random import Random, randrange
+
+
+def rotate_matrix(matrix, clockwise):
+    transpose = [
+        [matrix[j][i] for j in range(len(matrix))]
+        for i in range(len(matrix[0]))
+    ]
+    if clockwise:
+        return [row[::-1] for row in transpose]
+    else:
+        return transpose[::-1]
+
+
+class PlacementType(Enum):
+    EXTENDED = auto()
+    INFINITE = auto()
+    CLASSIC = auto()
+
+
+class GoalType(Enum):
+    FIXED = auto()
+    VARIABLE = auto()
+    STAGNANT = auto()
+
+
+class TetriminoType(Enum):
+    I = [[0, 0, 0, 0],
+        [1, 1, 1, 1],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0]]
+    J = [[1, 0, 0],
+        [1, 1, 1],
+        [0, 0, 0]]
+    L = [[0, 0, 1],
+        [1, 1, 1],
+        [0, 0, 0]]
+    O = [[1, 1],
+        [1, 1]]
+    T = [[0, 1, 0],
+        [1, 1, 1],
+        [0, 0, 0]]
+    S = [[0, 1, 1],
+        [1, 1, 0],
+        [0, 0, 0]]
+    Z = [[1, 1, 0],
+        [0, 1, 1],
+        [0, 0, 0]]
+
+
+class RotationState(Enum):
+    NORTH = auto()
+    EAST = auto()
+    SOUTH = auto()
+    WEST = auto()
+
+    @classmethod
+    def get_next_rotation_state(cls, starting_rotation, clockwise):
+        return NEXT_ROTATION_STATES[starting_rotation, clockwise]
+
+
+ROTATION_ORDER = (RotationState.NORTH, RotationState.EAST, RotationState.SOUTH, RotationState.WEST)
+NEXT_ROTATION_STATES = {
+    (rotation_state, clockwise): ROTATION_ORDER[(index + (1 if clockwise else -1)) % 4]
+    for index, rotation_state in enumerate(ROTATION_ORDER)
+    for clockwise in (True, False)
+}
+
+
+def _piece_shape(matrix):
+    row_masks = []
+    cols = []
+    for row, minos in enumerate(matrix):
+        mask = 0
+        for col, mino in enumerate(minos):
+            if mino:
+                mask |= 1 << col
+                cols.append(col)
+        if mask:
+            row_masks.append((row, mask))
+    return min(cols), max(cols), row_masks[-1][0], tuple(row_masks)
+
+
+def _piece_profile(matrix):
+    bottoms = {}
+    for row, minos in enumerate(matrix):
+        for col, mino in enumerate(minos):
+            if mino:
+                bottoms[col] = row
+    return tuple(sorted(bottoms.items()))
+
+
+def _piece_tables():
+    minos = {}
+    mino_offsets = {}
+    shapes = {}
+    profiles = {}
+    for tetrimino_type in TetriminoType:
+        matrix = tetrimino_type.value
+        for rotation_state in ROTATION_ORDER:
+            key = tetrimino_type, rotation_state
+            minos[key] = tuple(tuple(row) for row in matrix)
+            mino_offsets[key] = tuple(
+                (row, col) for row, line in enumerate(matrix) for col, mino in enumerate(line) if mino
+            )
+            shapes[key] = _piece_shape(matrix)
+            profiles[key] = _piece_profile(matrix)
+            matrix = rotate_matrix(matrix, True)
+    return minos, mino_offsets, shapes, profiles
+
+
+def _wall_kick_table():
+    # SRS kick tests as (column, row) offsets, applied after the basic rotation fails.
+    jlstz_kicks = {
+        (RotationState.NORTH, RotationState.EAST): ((-1, 0), (-1, -1), (0, 2), (-1, 2)),
+        (RotationState.EAST, RotationState.NORTH): ((1, 0), (1, 1), (0, -2), (1, -2)),
+        (RotationState.EAST, RotationState.SOUTH): ((1, 0), (1, 1), (0, -2), (1, -2)),
+        (RotationState.SOUTH, RotationState.EAST): ((-1, 0), (-1, -1), (0, 2), (-1, 2)),
+        (RotationState.SOUTH, RotationState.WEST): ((1, 0), (1, -1), (0, 2), (1, 2)),
+        (RotationState.WEST, RotationState.SOUTH): ((-1, 0), (-1, 1), (0, -2), (-1, -2)),
+        (RotationState.WEST, RotationState.NORTH): ((-1, 0), (-1, 1), (0, -2), (-1, -2)),
+        (RotationState.NORTH, RotationState.WEST): ((1, 0), (1, -1), (0, 2), (1, 2)),
+    }
+    i_kicks = {
+        (RotationState.NORTH, RotationState.EAST): ((-2, 0), (1, 0), (-2, 1), (1, -2)),
+        (RotationState.EAST, RotationState.NORTH): ((2, 0), (-1, 0), (2, -1), (-1, 2)),
+        (RotationState.EAST, RotationState.SOUTH): ((-1, 0), (2, 0), (-1, -2), (2, 1)),
+        (RotationState.SOUTH, RotationState.EAST): ((1, 0), (-2, 0), (1, 2), (-2, -1)),
+        (RotationState.SOUTH, RotationState.WEST): ((2, 0), (-1, 0), (2, -1), (-1, 2)),
+        (RotationState.WEST, RotationState.SOUTH): ((-2, 0), (1, 0), (-2, 1), (1, -2)),
+        (RotationState.WEST, RotationState.NORTH): ((1, 0), (-2, 0), (1, 2), (-2, -1)),
+        (RotationState.NORTH, RotationState.WEST): ((-1, 0), (2, 0), (-1, -2), (2, 1)),
+    }
+    kicks = {}
+    for tetrimino_type in TetriminoType:
+        type_kicks = i_kicks if tetrimino_type is TetriminoType.I else jlstz_kicks
+        for (current_rotation, next_rotation), tests in type_kicks.items():
+            kicks[tetrimino_type, current_rotation, next_rotation] = ((0, 0),) + tests
+    return kicks
+
+
+# Everything a piece needs per rotation is built once here, so rotating never allocates.
+# PIECE_MINOS: the rotated 0/1 matrix. PIECE_MINO_OFFSETS: ((row, column), ...) of each mino.
+# PIECE_SHAPES: (leftmost column, rightmost column, bottom row, ((row, column bitmask), ...)).
+# PIECE_PROFILES: ((column, lowest row of a mino in that column), ...).
+PIECE_MINOS, PIECE_MINO_OFFSETS, PIECE_SHAPES, PIECE_PROFILES = _piece_tables()
+# Keyed by (piece type, current rotation, next rotation), the unkicked test first.
+WALL_KICKS = _wall_kick_table()
+# T-spin corners as (row, column) inside the T's 3x3 box, the two front corners first.
+T_SPIN_CORNERS = {
+    RotationState.NORTH: ((0, 0), (0, 2), (2, 0), (2, 2)),
+    RotationState.EAST: ((0, 2), (2, 2), (0, 0), (2, 0)),
+    RotationState.SOUTH: ((2, 2), (2, 0), (0, 2), (0, 0)),
+    RotationState.WEST: ((2, 0), (0, 0), (2, 2), (0, 2)),
+}
+
+
+def _attack_table():
+    normal = (0, 0, 1, 2, 4)
+    t_spins = (0, 2, 4, 6)
+    mini_t_spins = (0, 0, 1)
+    attacks = {}
+    for lines in range(5):
+        for t_spin in (False, True):
+            for mini_t_spin in (False, True):
+                # A mini T-spin takes precedence, as it does for scoring.
+                if mini_t_spin:
+                    table = mini_t_spins
+                elif t_spin:
+                    table = t_spins
+                else:
+                    table = normal
+                attack = table[lines] if lines < len(table) else 0
+                difficult = lines == 4 or (lines > 0 and (t_spin or mini_t_spin))
+                for back_to_back in (False, True):
+                    attacks[lines, t_spin, mini_t_spin, back_to_back] = attack + (back_to_back and difficult)
+    return attacks
+
+
+# Garbage lines sent for (lines, T-spin, mini T-spin, back-to-back), with the back-to-back bonus included.
+ATTACK_TABLE = _attack_table()
+# Extra garbage lines by combo count, the number of clears in a row after the first; longer combos use the last entry.
+COMBO_ATTACK = (0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 4, 5)
+
+
+class Action(Enum):
+    LEFT = auto()
+    RIGHT = auto()
+    ROTATE_CLOCKWISE = auto()
+    ROTATE_COUNTERCLOCKWISE = auto()
+    SOFT_DROP = auto()
+    SOFT_DROP_RELEASE = auto()
+    HARD_DROP = auto()
+    HOLD = auto()
+    GRAVITY = auto()
+    LOCK = auto()
+    # Added last so recorded action codes keep their values.
+    SOFT_DROP_RESUME = auto()
+
+
+class Event(Enum):
+    SPAWNED = auto()
+    MOVED = auto()
+    ROTATED = auto()
+    FELL = auto()
+    HELD = auto()
+    LOCKED = auto()
+    SCORE_CHANGED = auto()
+    LINES_CHANGED = auto()
+    LEVEL_CHANGED = auto()
+    GARBAGE_QUEUED = auto()
+    GARBAGE_ADDED = auto()
+    GARBAGE_CANCELLED = auto()
+    GARBAGE_SENT = auto()
+    LOCK_STARTED = auto()
+    LOCK_RESET = auto()
+    LOCK_CANCELLED = auto()
+    GRAVITY_RESET = auto()
+    GAME_OVER = auto()
+
+
+# Input codes besides the Action values, for recorders.
+INPUT_START = 0
+INPUT_GARBAGE = 255
+
+
+class Tetrimino:
+    def __init__(self, piece_type, upper_left_coords):
+        self.piece_type = piece_type
+        self.upper_left_coords = upper_left_coords
+        self.set_rotation(RotationState.NORTH)
+
+    def get_wall_kick_tests(self, next_rotation):
+        return WALL_KICKS[self.piece_type, self.rotation_state, next_rotation]
+
+    def get_mino_coords(self, row_offset=0, col_offset=0):
+        start_x, start_y = self.upper_left_coords
+        start_y += row_offset
+        start_x += col_offset
+        return [(start_y + row, start_x + col) for row, col in self.mino_offsets]
+
+    def set_rotation(self, rotation_state):
+        key = self.piece_type, rotation_state
+        self.rotation_state = rotation_state
+        self.minos = PIECE_MINOS[key]
+        self.mino_offsets = PIECE_MINO_OFFSETS[key]
+        self.shape = PIECE_SHAPES[key]
+        self.profile = PIECE_PROFILES[key]
+
+    def rotate(self, clockwise):
+        self.set_rotation(NEXT_ROTATION_STATES[self.rotation_state, clockwise])
+
+    def move_horizontally(self, dir, amount):
+        x, y = self.upper_left_coords
+        self.upper_left_coords = x + (dir * amount), y
+
+    def move_vertically(self, dir, amount):
+        x, y = self.upper_left_coords
+        self.upper_left_coords = x, y + (dir * amount)
+
+    def __repr__(self):
+        return f'{self.piece_type.name} Tetrimino. Coords={self.upper_left_coords}. Rotation={self.rotation_state.name}'
+
+    def __str__(self):
+        string = ''
+        for row in self.minos:
+            for mino in row:
+                if mino:
+                    string += '\u25A0'
+                else:
+                    string += ' '
+            string += '\n'
+        return string[:-1]
+
+
+class TetrisState:
+    ROWS = 20
+    COLUMNS = 10
+    BUFFER_ROWS = 20
+    TOTAL_ROWS = ROWS + BUFFER_ROWS
+    FULL_ROW = (1 << COLUMNS) - 1
+    TOTAL_HEIGHT = 24
+    NEXT_PIECES = 6
+    MAX_LEVEL = 15
+    LOCK_MOVES = 15
+    LOCK_DELAY = 500
+    SOFT_DROP_FACTOR = 1/20
+    GARBAGE = 'GARBAGE'
+
+    def __init__(self, placement_mode=PlacementType.EXTENDED, starting_level=1, goal_type=GoalType.VARIABLE, seed=None, garbage_messiness=100):
+        self.placement_mode = placement_mode
+        self.starting_level = starting_level
+        self.goal_type = goal_type
+        if not 0 <= garbage_messiness <= 100:
+            raise ValueError(f'garbage_messiness must be a percentage from 0 to 100, not {garbage_messiness}')
+        # Percent chance that each garbage row has its hole in a new column rather than under the last one.
+        self.garbage_messiness = garbage_messiness
+        # Anything with a record(code, value) method; it is sent every input so games can be replayed.
+        self.recorder = None
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        # All randomness comes from one generator per game, so the seed and the inputs reproduce a game.
+        self.seed = randrange(2**32) if seed is None else seed
+        self.rng = Random(self.seed)
+        # One bitmask per row, bit n set when column n is filled. Cells keep the sprite names for rendering.
+        self.board = [0] * TetrisState.TOTAL_ROWS
+        self.cells = [[None] * TetrisState.COLUMNS for _ in range(TetrisState.TOTAL_ROWS)]
+        # How far each column's highest filled cell is above the bottom of the board, 0 when empty.
+        self.heights = [0] * TetrisState.COLUMNS
+        self.falling_tetrimino = None
+        self.held_type = None
+        self.has_held = False
+        self.next_tetriminos = []
+        self.seven_bag = []
+        self.game_started = False
+        self.game_over = False
+        self.level = self.starting_level
+        self.score = 0
+        self.back_to_back = False
+        self.combo = -1
+        self.lines_cleared = 0
+        self.goal = self.get_next_goal()
+        self.lock_moves = TetrisState.LOCK_MOVES
+        self.lock_movement = False
+        self.lock_pending = False
+        self.falling_lowest = 0
+        self.rotation_point = None
+        self.speed_factor = 1
+        self.queued_garbage = 0
+        self.garbage_hole = None
+        self.events = []
+
+    def take_events(self):
+        events, self.events = self.events, []
+        return events
+
+    def start(self):
+        if self.recorder is not None:
+            self.recorder.record(INPUT_START, 0)
+        self.generate_seven_bag()
+        self.spawn_tetrimino(self.random_tetrimino())
+        self.game_started = True
+        return self.take_events()
+
+    def step(self, actions):
+        for action in actions:
+            self.apply(action)
+        return self.take_events()
+
+    def apply(self, action):
+        if self.recorder is not None:
+            self.recorder.record(action.value, 0)
+        if self.game_over or self.falling_tetrimino is None:
+            return
+        if action is Action.HOLD:
+            self.hold_tetrimino()
+        elif action is Action.GRAVITY:
+            self.gravity()
+        elif action is Action.LOCK:
+            self.lock_tetrimino()
+        elif action is Action.SOFT_DROP_RELEASE:
+            self.speed_factor = 1
+        elif not self.lock_movement:
+            match action:
+                case Action.LEFT:
+                    self.tetrimino_shift(-1)
+                case Action.RIGHT:
+                    self.tetrimino_shift(1)
+                case Action.ROTATE_CLOCKWISE:
+                    self.tetrimino_rotate(True)
+                case Action.ROTATE_COUNTERCLOCKWISE:
+                    self.tetrimino_rotate(False)
+                case Action.SOFT_DROP:
+                    if not self.lock_pending:
+                        self.speed_factor = TetrisState.SOFT_DROP_FACTOR
+                        self.gravity()
+                        self.events.append((Event.GRAVITY_RESET, None))
+                case Action.SOFT_DROP_RESUME:
+                    # A key auto-repeat from the OS: keep the soft drop speed, but leave the falling to gravity.
+                    self.speed_factor = TetrisState.SOFT_DROP_FACTOR
+                case Action.HARD_DROP:
+                    self.tetrimino_drop()
+
+    def gravity_interval(self):
+        return int(pow((0.8 - ((self.level - 1) * 0.007)), self.level-1) * 1000) * self.speed_factor
+
+    def set_game_over(self):
+        if self.game_over:
+            return
+        self.game_over = True
+        self.cancel_lock()
+        self.events.append((Event.GAME_OVER, None))
+
+    def generate_seven_bag(self):
+        if not self.seven_bag:
+            self.seven_bag = [t_type for t_type in TetriminoType]
+            self.rng.shuffle(self.seven_bag)
+        for _ in range(TetrisState.NEXT_PIECES+1-len(self.next_tetriminos)):
+            self.next_tetriminos.append(self.seven_bag.pop(0))
+
+    def random_tetrimino(self):
+        self.generate_seven_bag()
+        return self.next_tetriminos.pop(0)
+
+    def get_tetrimino_spawn_pos(self, tetrimino_type):
+        tetrimino_width = len(tetrimino_type.value[0])
+        start_col = (TetrisState.COLUMNS - tetrimino_width) // 2
+        spawn_pos = (start_col, TetrisState.ROWS-3)
+        return spawn_pos
+
+    def fits(self, tetrimino, dr=0, dc=0):
+        x, y = tetrimino.upper_left_coords
+        return self.shape_fits(tetrimino.shape, x + dc, y + dr)
+
+    def shape_fits(self, shape, x, y):
+        left, right, bottom, row_masks = shape
+        if x + left < 0 or x + right >= TetrisState.COLUMNS or y + bottom >= TetrisState.TOTAL_ROWS:
+            return False
+        board = self.board
+        for row_offset, mask in row_masks:
+            row = y + row_offset
+            if row >= 0 and board[row] & (mask << x if x >= 0 else mask >> -x):
+                return False
+        return True
+
+    def landing_row(self, shape, profile, x, y):
+        # A piece above the surface of every column it covers lands where the nearest surface stops it.
+        # One tucked under an overhang has cells below it to skip, so that falls back to testing each row.
+        heights = self.heights
+        landing = TetrisState.TOTAL_ROWS
+        for col, bottom in profile:
+            surface = TetrisState.TOTAL_ROWS - heights[x + col]
+            if y + bottom >= surface:
+                break
+            landing = min(landing, surface - 1 - bottom)
+        else:
+            return landing
+        while self.shape_fits(shape, x, y + 1):
+            y += 1
+        return y
+
+    def drop_distance(self):
+        tetrimino = self.falling_tetrimino
+        x, y = tetrimino.upper_left_coords
+        return self.landing_row(tetrimino.shape, tetrimino.profile, x, y) - y
+
+    def update_heights(self, top=0):
+        # Rows above top have to be empty.
+        heights = [0] * TetrisState.COLUMNS
+        covered = 0
+        board = self.board
+        for row in range(top, TetrisState.TOTAL_ROWS):
+            mask = board[row]
+            new = mask & ~covered
+            while new:
+                low = new & -new
+                heights[low.bit_length() - 1] = TetrisState.TOTAL_ROWS - row
+                new ^= low
+            covered |= mask
+            if covered == TetrisState.FULL_ROW:
+                break
+        self.heights = heights
+
+    def ghost_coords(self):
+        if self.falling_tetrimino is None:
+            return []
+        return self.falling_tetrimino.get_mino_coords(row_offset=self.drop_distance())
+
+    def spawn_tetrimino(self, tetrimino_type):
+        if self.game_over:
+            return
+        if self.queued_garbage:
+            self.add_garbage()
+            # Garbage that pushed the stack out of the top has already ended the game.
+            if self.game_over:
+                return
+        self.cancel_lock()
+        spawn_pos = self.get_tetrimino_spawn_pos(tetrimino_type)
+        self.falling_lowest = spawn_pos[1]
+        self.lock_movement = False
+        self.falling_tetrimino = Tetrimino(tetrimino_type, spawn_pos)
+        self.events.append((Event.SPAWNED, tetrimino_type))
+        if not self.fits(self.falling_tetrimino):
+            self.set_game_over()
+        elif self.fits(self.falling_tetrimino, dr=1):
+            self.tetrimino_fall()
+
+    def hold_tetrimino(self):
+        if self.has_held or self.falling_tetrimino is None:
+            return
+        falling_type = self.held_type if self.held_type is not None else self.random_tetrimino()
+        self.held_type = self.falling_tetrimino.piece_type
+        self.spawn_tetrimino(falling_type)
+        self.has_held = True
+        self.events.append((Event.HELD, self.held_type))
+
+    def start_lock(self):
+        if not self.lock_pending:
+            self.lock_pending = True
+            self.events.append((Event.LOCK_STARTED, None))
+
+    def cancel_lock(self):
+        if self.lock_pending:
+            self.lock_pending = False
+            self.events.append((Event.LOCK_CANCELLED, None))
+
+    def reset_lock(self):
+        if self.placement_mode is PlacementType.CLASSIC or not self.lock_pending:
+            return
+        self.events.append((Event.LOCK_RESET, None))
+        if self.placement_mode is PlacementType.EXTENDED:
+            self.lock_moves -= 1
+            if self.lock_moves == 0:
+                self.lock_movement = True
+                self.lock_tetrimino()
+
+    def lock_tetrimino(self):
+        self.cancel_lock()
+        if self.fits(self.falling_tetrimino, dr=1):
+            return
+        t_spin, mini_t_spin = self.detect_t_spin()
+        self.lock_moves = TetrisState.LOCK_MOVES
+        piece_name = self.falling_tetrimino.piece_type.name
+        visible = False
+        mino_coords = self.falling_tetrimino.get_mino_coords()
+        for row, col in mino_coords:
+            if row >= 0:
+                self.board[row] |= 1 << col
+                self.cells[row][col] = piece_name
+                self.heights[col] = max(self.heights[col], TetrisState.TOTAL_ROWS - row)
+            if row >= TetrisState.BUFFER_ROWS:
+                visible = True
+        self.falling_tetrimino = None
+        if not visible:
+            self.set_game_over()
+        # Every other row already has a gap, so only the rows the piece landed in can have filled up.
+        lines_cleared = 0 if self.game_over else self.clear_lines({row for row, _ in mino_coords if row >= 0})
+        self.attack(lines_cleared, t_spin, mini_t_spin)
+        self.events.append((Event.LOCKED, (lines_cleared, t_spin, mini_t_spin)))
+        self.has_held = False
+        self.update_score(lines_cleared, t_spin, mini_t_spin)
+        self.update_lines_cleared(lines_cleared, t_spin, mini_t_spin)
+        if lines_cleared == 4:
+            self.back_to_back = True
+        elif lines_cleared > 0:
+            if t_spin or mini_t_spin:
+                self.back_to_back = True
+        self.spawn_tetrimino(self.random_tetrimino())
+
+    def gravity(self):
+        fell = self.tetrimino_fall()
+        if self.speed_factor != 1 and fell:
+            self.score += 1
+            self.events.append((Event.SCORE_CHANGED, self.score))
+
+    def tetrimino_fall(self):
+        if self.fits(self.falling_tetrimino, dr=1):
+            self.falling_tetrimino.move_vertically(1, 1)
+            falling_y = self.falling_tetrimino.upper_left_coords[1]
+            if falling_y > self.falling_lowest:
+                self.lock_moves = TetrisState.LOCK_MOVES
+            self.falling_lowest = max(self.falling_lowest, falling_y)
+            if self.placement_mode is PlacementType.CLASSIC:
+                self.cancel_lock()
+            self.rotation_point = None
+            self.events.append((Event.FELL, self.speed_factor != 1))
+            return True
+        else:
+            self.start_lock()
+            return False
+
+    def tetrimino_drop(self):
+        # Moves straight to the landing row in one step; the lock straight after makes the
+        # per-row bookkeeping of tetrimino_fall moot.
+        lines_moved = self.drop_distance()
+        if lines_moved:
+            self.falling_tetrimino.move_vertically(1, lines_moved)
+            self.falling_lowest = max(self.falling_lowest, self.falling_tetrimino.upper_left_coords[1])
+            self.events.append((Event.FELL, self.speed_factor != 1))
+        self.rotation_point = None
+        self.score += 2 * lines_moved
+        self.events.append((Event.SCORE_CHANGED, self.score))
+        self.lock_tetrimino()
+
+    def tetrimino_shift(self, dc):
+        if not self.fits(self.falling_tetrimino, dc=dc):
+            return
+        self.falling_tetrimino.move_horizontally(dc, 1)
+        self.rotation_point = None
+        self.events.append((Event.MOVED, dc))
+        self.reset_lock()
+
+    def tetrimino_rotate(self, clockwise):
+        tetrimino = self.falling_tetrimino
+        next_rotation = NEXT_ROTATION_STATES[tetrimino.rotation_state, clockwise]
+        shape = PIECE_SHAPES[tetrimino.piece_type, next_rotation]
+        x, y = tetrimino.upper_left_coords
+        # Test the kicks against the target rotation's shape; the piece only changes once one fits.
+        for kick_num, (kick_x, kick_y) in enumerate(tetrimino.get_wall_kick_tests(next_rotation)):
+            if self.shape_fits(shape, x + kick_x, y + kick_y):
+                tetrimino.upper_left_coords = x + kick_x, y + kick_y
+                tetrimino.set_rotation(next_rotation)
+                self.rotation_point = kick_num + 1
+                self.events.append((Event.ROTATED, clockwise))
+                self.reset_lock()
+                return
+        self.rotation_point = None
+
+    def attack(self, lines, t_spin, mini_t_spin):
+        # Runs before update_score, so back_to_back still says whether the last clear was difficult.
+        if lines == 0:
+            self.combo = -1
+            return
+        self.combo += 1
+        attack = (
+            ATTACK_TABLE[lines, t_spin, mini_t_spin, self.back_to_back] +
+            COMBO_ATTACK[min(self.combo, len(COMBO_ATTACK) - 1)]
+        )
+        # Incoming garbage is cancelled first; only what is left over is sent.
+        cancelled = min(attack, self.queued_garbage)
+        if cancelled:
+            self.queued_garbage -= cancelled
+            self.events.append((Event.GARBAGE_CANCELLED, self.queued_garbage))
+        if attack > cancelled:
+            self.events.append((Event.GARBAGE_SENT, attack - cancelled))
+
+    def queue_garbage(self, lines):
+        if self.recorder is not None:
+            self.recorder.record(INPUT_GARBAGE, lines)
+        self.queued_garbage += lines
+        self.queued_garbage = min(self.queued_garbage, TetrisState.TOTAL_HEIGHT)
+        self.events.append((Event.GARBAGE_QUEUED, self.queued_garbage))
+        return self.take_events()
+
+    def add_garbage(self):
+        lines = self.queued_garbage
+        if any(self.board[:lines]):
+            self.set_game_over()
+        rng = self.rng
+        hole = self.garbage_hole
+        garbage_rows = []
+        garbage_cells = []
+        for _ in range(lines):
+            # At 100% no roll is made, so games keep the random stream they had before messiness existed.
+            if hole is None or self.garbage_messiness >= 100 or rng.random() * 100 < self.garbage_messiness:
+                hole = rng.randrange(TetrisState.COLUMNS)
+            garbage_rows.append(TetrisState.FULL_ROW ^ 1 << hole)
+            row = [TetrisState.GARBAGE] * TetrisState.COLUMNS
+            row[hole] = None
+            garbage_cells.append(row)
+        self.garbage_hole = hole
+        # The whole stack moves up by slicing the row lists; no cell is touched on its own.
+        self.board = self.board[lines:] + garbage_rows
+        self.cells = self.cells[lines:] + garbage_cells
+        self.update_heights(max(0, TetrisState.TOTAL_ROWS - max(self.heights) - lines))
+        self.queued_garbage = 0
+        self.events.append((Event.GARBAGE_ADDED, lines))
+
+    def clear_lines(self, rows=None):
+        board = self.board
+        full_row = TetrisState.FULL_ROW
+        if rows is None:
+            rows = range(TetrisState.TOTAL_ROWS)
+        full_rows = sorted(row for row in rows if board[row] == full_row)
+        if not full_rows:
+            return 0
+        # One compaction pass: empty rows on top, then the runs of rows between the full ones, in order.
+        lines = len(full_rows)
+        cells = self.cells
+        new_board = [0] * lines
+        new_cells = [[None] * TetrisState.COLUMNS for _ in range(lines)]
+        start = 0
+        for row in full_rows:
+            new_board += board[start:row]
+            new_cells += cells[start:row]
+            start = row + 1
+        new_board += board[start:]
+        new_cells += cells[start:]
+        self.board = new_board
+        self.cells = new_cells
+        # Every column was filled in the cleared rows, so the tallest drops by exactly the lines cleared.
+        self.update_heights(TetrisState.TOTAL_ROWS - max(self.heights) + lines)
+        return lines
+
+    def detect_t_spin(self):
+        if self.falling_tetrimino.piece_type is not TetriminoType.T:
+            return False, False
+        if self.rotation_point is None:
+            return False, False
+        x, y = self.falling_tetrimino.upper_left_coords
+        filled = []
+        for row_offset, col_offset in T_SPIN_CORNERS[self.falling_tetrimino.rotation_state]:
+            row, col = y + row_offset, x + col_offset
+            if 0 <= row < TetrisState.TOTAL_ROWS and 0 <= col < TetrisState.COLUMNS:
+                filled.append(bool(self.board[row] >> col & 1))
+            else:
+                filled.append(True)
+        a, b, c, d = filled
+        t_spin_found = False
+        mini_t_spin_found = False
+        if a and b:
+            if c or d:
+                t_spin_found = True
+        if c and d:
+            if a or b:
+                mini_t_spin_found = True
+        if self.rotation_point == 5:
+            t_spin_found = True
+            mini_t_spin_found = False
+        return t_spin_found, mini_t_spin_found
+
+    def update_score(self, lines, t_spin, mini_t_spin):
+        action_total = 0
+        if mini_t_spin:
+            if lines == 0:
+                action_total = 100 * self.level
+            elif lines == 1:
+                action_total = 200 * self.level
+        elif t_spin:
+            if lines == 0:
+                action_total = 400 * self.level
+            elif lines == 1:
+                action_total = 800 * self.level
+            elif lines == 2:
+                action_total = 1200 * self.level
+            elif lines == 3:
+                action_total = 1600 * self.level
+        else:
+            if lines in range(1, 4):
+                self.back_to_back = False
+            if lines == 1:
+                action_total = 100 * self.level
+            elif lines == 2:
+                action_total = 300 * self.level
+            elif lines == 3:
+                action_total = 500 * self.level
+            elif lines == 4:
+                action_total = 800 * self.level
+        action_total += .5 * action_total * self.back_to_back
+        self.score += int(action_total)
+        self.events.append((Event.SCORE_CHANGED, self.score))
+
+    def update_lines_cleared(self, lines, t_spin, mini_t_spin):
+        cleared_lines = 0
+        if self.goal_type is not GoalType.STAGNANT:
+            if self.goal_type is GoalType.FIXED:
+                cleared_lines = lines
+            elif self.goal_type is GoalType.VARIABLE:
+                if mini_t_spin:
+                    if lines == 0:
+                        cleared_lines = 1
+                    elif lines == 1:
+                        cleared_lines = 2
+                elif t_spin:
+                    if lines == 0:
+                        cleared_lines = 4
+                    elif lines == 1:
+                        cleared_lines = 8
+                    elif lines == 2:
+                        cleared_lines = 12
+                    elif lines == 3:
+                        cleared_lines = 16
+                else:
+                    if lines == 1:
+                        cleared_lines = 1
+                    elif lines == 2:
+                        cleared_lines = 3
+                    elif lines == 3:
+                        cleared_lines = 5
+                    elif lines == 4:
+                        cleared_lines = 8
+            self.lines_cleared += cleared_lines
+            if self.back_to_back and lines != 0:
+                self.lines_cleared *= 1.5
+                self.lines_cleared = int(self.lines_cleared)
+        else:
+            self.lines_cleared += lines
+        self.events.append((Event.LINES_CHANGED, self.lines_cleared))
+        if self.lines_cleared >= self.goal:
+            self.level = min(TetrisState.MAX_LEVEL, self.level+1)
+            self.goal = self.get_next_goal()
+            self.events.append((Event.LEVEL_CHANGED, self.level))
+
+    def get_next_goal(self):
+        if self.goal_type is GoalType.VARIABLE:
+            return 5 * self.level
+        elif self.goal_type is GoalType.FIXED:
+            if self.game_started:
+                return 10
+            else:
+                return 10 * self.level
+        elif self.goal_type is GoalType.STAGNANT:
+            return float('inf')
+
+
+class TetrisScheduler:
+    """Runs game logic in fixed steps of TICK_MS, however often advance is called.
+
+    Stalls up to MAX_CATCH_UP_MS are caught up in full. Longer stalls, such as a dragged window or a
+    swapped-out process, deliberately dilate time instead: only MAX_CATCH_UP_MS of play is caught up
+    and the rest is dropped (and counted in dilated_ms). Gravity, DAS and lock delay then run behind
+    wall time, rather than the player getting back a piece that fell or locked while nothing was drawn.
+    Both Chesstris boards stall together, so they still stay in step with each other.
+    """
+    TICK_MS = 4
+    MAX_CATCH_UP_MS = 250
+    DAS = 170
+    ARR = 50
+
+    def __init__(self, state, clock=time.monotonic):
+        self.state = state
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.last_time = None
+        self.accumulator = 0
+        self.ticks = 0
+        self.dilated_ms = 0
+        self.gravity_elapsed = 0
+        self.lock_elapsed = None
+        self.shift = 0
+        self.shift_elapsed = 0
+        self.shift_delay = TetrisScheduler.DAS
+
+    def start(self):
+        self.reset()
+        events = self.state.start()
+        self.handle_events(events)
+        return events
+
+    def resume(self):
+        # Time spent paused is not caught up on.
+        self.last_time = None
+        self.accumulator = 0
+
+    def step(self, action):
+        events = self.state.step((action,))
+        self.handle_events(events)
+        return events
+
+    def handle_events(self, events):
+        for event, _ in events:
+            match event:
+                case Event.GRAVITY_RESET:
+                    self.gravity_elapsed = 0
+                case Event.LOCK_STARTED | Event.LOCK_RESET:
+                    self.lock_elapsed = 0
+                case Event.LOCK_CANCELLED:
+                    self.lock_elapsed = None
+
+    def press_shift(self, direction):
+        self.shift = direction
+        self.shift_elapsed = 0
+        self.shift_delay = TetrisScheduler.DAS
+
+    def resume_shift(self, direction):
+        # A key auto-repeat from the OS: keep the DAS timer running rather than restarting it.
+        self.shift = direction
+
+    def release_shift(self, direction):
+        if self.shift == direction:
+            self.shift = 0
+
+    def advance(self, now=None):
+        now = self.clock() if now is None else now
+        if self.last_time is None:
+            self.last_time = now
+        elapsed = (now - self.last_time) * 1000
+        if elapsed > TetrisScheduler.MAX_CATCH_UP_MS:
+            self.dilated_ms += elapsed - TetrisScheduler.MAX_CATCH_UP_MS
+            elapsed = TetrisScheduler.MAX_CATCH_UP_MS
+        self.accumulator += elapsed
+        self.last_time = now
+        events = []
+        while self.accumulator >= TetrisScheduler.TICK_MS and not self.state.game_over:
+            self.accumulator -= TetrisScheduler.TICK_MS
+            events += self.tick()
+        return events
+
+    def tick(self):
+        self.ticks += 1
+        events = []
+        if self.shift:
+            self.shift_elapsed += TetrisScheduler.TICK_MS
+            while self.shift_elapsed >= self.shift_delay:
+                self.shift_elapsed -= self.shift_delay
+                self.shift_delay = TetrisScheduler.ARR
+                events += self.step(Action.RIGHT if self.shift > 0 else Action.LEFT)
+        self.gravity_elapsed += TetrisScheduler.TICK_MS
+        interval = self.state.gravity_interval()
+        while self.gravity_elapsed >= interval and self.state.falling_tetrimino is not None:
+            self.gravity_elapsed -= interval
+            events += self.step(Action.GRAVITY)
+        if self.lock_elapsed is not None:
+            self.lock_elapsed += TetrisScheduler.TICK_MS
+            if self.lock_elapsed >= TetrisState.LOCK_DELAY:
+                self.lock_elapsed = None
+                events += self.step(Action.LOCK)
+        return events
+
+
+def coordinate_fits(cells, tetrimino, dr=0, dc=0):
+    mino_coords = tetrimino.get_mino_coords(row_offset=dr, col_offset=dc)
+    if (
+        max(row for row, _ in mino_coords) >= TetrisState.TOTAL_ROWS or
+        min(col for _, col in mino_coords) < 0 or
+        max(col for _, col in mino_coords) >= TetrisState.COLUMNS
+    ):
+        return False
+    for row, col in mino_coords:
+        if row >= 0 and cells[row][col] is not None:
+            return False
+    return True
+
+
+def benchmark_collision(iterations, seed):
+    rng = Random(seed)
+    state = TetrisState()
+    for row in range(TetrisState.TOTAL_ROWS - 12, TetrisState.TOTAL_ROWS):
+        for col in range(TetrisState.COLUMNS):
+            if rng.random() < 0.7:
+                state.board[row] |= 1 << col
+                state.cells[row][col] = TetrisState.GARBAGE
+        if row % 3 == 0:
+            state.board[row] = TetrisState.FULL_ROW
+            state.cells[row] = [TetrisState.GARBAGE] * TetrisState.COLUMNS
+    probes = []
+    for _ in range(1000):
+        tetrimino = Tetrimino(rng.choice(list(TetriminoType)), (rng.randint(-1, 8), rng.randint(0, 36)))
+        for _ in range(rng.randint(0, 3)):
+            tetrimino.rotate(True)
+        probes.append((tetrimino, rng.randint(-1, 1), rng.randint(-1, 1)))
+    rounds = max(1, iterations // len(probes))
+    for tetrimino, dr, dc in probes:
+        assert state.fits(tetrimino, dr, dc) == coordinate_fits(state.cells, tetrimino, dr, dc)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for tetrimino, dr, dc in probes:
+            coordinate_fits(state.cells, tetrimino, dr, dc)
+    coordinate_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for tetrimino, dr, dc in probes:
+            state.fits(tetrimino, dr, dc)
+    mask_time = time.perf_counter() - start
+    checks = rounds * len(probes)
+    print(f'collision  coordinates {checks / coordinate_time:>12.0f}/s  bitmask {checks / mask_time:>12.0f}/s  ({coordinate_time / mask_time:.1f}x)')
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        [row for row, line in enumerate(state.cells) if all(line)]
+    coordinate_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(rounds):
+        [row for row, mask in enumerate(state.board) if mask == TetrisState.FULL_ROW]
+    mask_time = time.perf_counter() - start
+    print(f'full rows  cells       {rounds / coordinate_time:>12.0f}/s  bitmask {rounds / mask_time:>12.0f}/s  ({coordinate_time / mask_time:.1f}x)')
+
+
+class PreviousClearState(TetrisState):
+    # clear_lines and update_heights as they were before the compaction pass, verbatim, as the benchmark baseline.
+    def clear_lines(self):
+        full_rows = [row for row, mask in enumerate(self.board) if mask == TetrisState.FULL_ROW]
+        for row in full_rows:
+            del self.board[row]
+            self.board.insert(0, 0)
+            del self.cells[row]
+            self.cells.insert(0, [None] * TetrisState.COLUMNS)
+        if full_rows:
+            self.update_heights()
+        return len(full_rows)
+
+    def update_heights(self):
+        heights = [0] * TetrisState.COLUMNS
+        covered = 0
+        for row, mask in enumerate(self.board):
+            new = mask & ~covered
+            while new:
+                low = new & -new
+                heights[low.bit_length() - 1] = TetrisState.TOTAL_ROWS - row
+                new ^= low
+            covered |= mask
+            if covered == TetrisState.FULL_ROW:
+                break
+        self.heights = heights
+
+
+def line_clear_boards(rng):
+    # Each board comes with the rows the last piece locked into, which are the only ones that can be full.
+    def stack(height, holes, full_rows):
+        board = [0] * TetrisState.TOTAL_ROWS
+        for row in range(TetrisState.TOTAL_ROWS - height, TetrisState.TOTAL_ROWS):
+            gaps = rng.sample(range(TetrisState.COLUMNS), holes)
+            board[row] = TetrisState.FULL_ROW & ~sum(1 << col for col in gaps)
+        for row in full_rows:
+            board[TetrisState.TOTAL_ROWS - 1 - row] = TetrisState.FULL_ROW
+        return board
+
+    bottom = {TetrisState.TOTAL_ROWS - 1 - row for row in range(4)}
+    return {
+        'none': (stack(10, 1, ()), bottom),
+        'tetris': (stack(10, 1, (0, 1, 2, 3)), bottom),
+        'split': (stack(10, 2, (0, 2, 3)), bottom),
+        'garbage': (stack(18, 1, (16, 17)), {TetrisState.TOTAL_ROWS - 1 - row for row in range(14, 18)}),
+    }
+
+
+def benchmark_line_clear(iterations, seed):
+    # The previous clear_lines scans every row, so the compaction is timed doing the same; locks only
+    # ever pass it the rows the piece touched, which is timed on its own in the last column.
+    rounds = max(1, iterations // 100)
+    for name, (board, rows) in line_clear_boards(Random(seed)).items():
+        cells = [
+            [TetrisState.GARBAGE if mask >> col & 1 else None for col in range(TetrisState.COLUMNS)]
+            for mask in board
+        ]
+        previous = PreviousClearState()
+        previous.board, previous.cells = board[:], cells[:]
+        previous.update_heights()
+        heights = previous.heights
+        expected_lines = previous.clear_lines()
+        expected = previous.board, previous.cells, previous.heights
+        compacted = TetrisState()
+        for candidates in (None, rows):
+            compacted.board, compacted.cells, compacted.heights = board[:], cells[:], heights
+            assert compacted.clear_lines(candidates) == expected_lines
+            assert (compacted.board, compacted.cells, compacted.heights) == expected
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            previous.board, previous.cells, previous.heights = board[:], cells[:], heights
+            previous.clear_lines()
+        previous_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(rounds):
+            compacted.board, compacted.cells, compacted.heights = board[:], cells[:], heights
+            compacted.clear_lines()
+        compact_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(rounds):
+            compacted.board, compacted.cells, compacted.heights = board[:], cells[:], heights
+            compacted.clear_lines(rows)
+        touched_time = time.perf_counter() - start
+        print(
+            f'clear {name:<8} previous {rounds / previous_time:>10.0f}/s  '
+            f'compaction {rounds / compact_time:>10.0f}/s ({previous_time / compact_time:.1f}x)  '
+            f'touched rows only {rounds / touched_time:>10.0f}/s ({previous_time / touched_time:.1f}x)'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare bitmask rows with coordinate lists for collision and line checks, and time line clears.')
+    parser.add_argument('-n', '--iterations', type=int, default=200000, help='collision checks per approach (default: 200000)')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='seed for the random boards and probes (default: 0)')
+    args = parser.parse_args()
+    benchmark_collision(args.iterations, args.seed)
+    benchmark_line_clear(args.iterations, args.seed)
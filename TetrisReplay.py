@@ -0,0 +1,89 @@
+import argparse
+import struct
+import time
+from TetrisEngine import PlacementType, GoalType, Action, TetrisState, INPUT_START, INPUT_GARBAGE
+
+
+MAGIC = b'TTRP'
+VERSION = 2
+# Magic, version, seed, placement mode, starting level, goal type, garbage messiness.
+HEADER = struct.Struct('<4sBQBBBB')
+# Milliseconds since the recording started, input code, value (lines of garbage, else 0).
+RECORD = struct.Struct('<IBB')
+
+
+class InputRecorder:
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.data = bytearray()
+        self.start_time = 0
+
+    def start(self, state):
+        self.data = bytearray(HEADER.pack(
+            MAGIC, VERSION, state.seed, state.placement_mode.value, state.starting_level, state.goal_type.value,
+            state.garbage_messiness
+        ))
+        self.start_time = self.clock()
+
+    def record(self, code, value):
+        tick = int((self.clock() - self.start_time) * 1000)
+        self.data += RECORD.pack(tick, code, value)
+
+    @property
+    def inputs(self):
+        return (len(self.data) - HEADER.size) // RECORD.size
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(self.data)
+
+
+def load_recording(path):
+    with open(path, 'rb') as file:
+        data = file.read()
+    magic, version, seed, placement_mode, starting_level, goal_type, garbage_messiness = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'{path} is not a version {VERSION} Tetris recording')
+    header = {
+        'seed': seed,
+        'placement_mode': PlacementType(placement_mode),
+        'starting_level': starting_level,
+        'goal_type': GoalType(goal_type),
+        'garbage_messiness': garbage_messiness
+    }
+    return header, list(RECORD.iter_unpack(memoryview(data)[HEADER.size:]))
+
+
+def replay(header, inputs):
+    state = TetrisState(
+        header['placement_mode'], header['starting_level'], header['goal_type'], header['seed'], header['garbage_messiness']
+    )
+    actions = {action.value: action for action in Action}
+    for _, code, value in inputs:
+        if code == INPUT_START:
+            state.start()
+        elif code == INPUT_GARBAGE:
+            state.queue_garbage(value)
+        else:
+            state.apply(actions[code])
+        state.events.clear()
+    return state
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay recorded Tetris games headlessly at full speed.')
+    parser.add_argument('recordings', nargs='+', help='recording files to replay')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='times to replay each recording, for timing (default: 1)')
+    args = parser.parse_args()
+    for path in args.recordings:
+        header, inputs = load_recording(path)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            state = replay(header, inputs)
+        elapsed = time.perf_counter() - start
+        game_time = inputs[-1][0] / 1000 if inputs else 0
+        print(
+            f'{path}: seed {header["seed"]} {len(inputs)} inputs over {game_time:.1f}s of play, '
+            f'score {state.score} lines {state.lines_cleared} level {state.level} {"game over" if state.game_over else "unfinished"}, '
+            f'replayed in {elapsed / args.repeat * 1000:.2f}ms ({len(inputs) * args.repeat / elapsed:.0f} inputs/s)'
+        )
@@ -0,0 +1,103 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from TetrisEngine import PlacementType, GoalType, TetrisState
+from TetrisAI import TetrisAI
+
+
+FIELDS = ('game', 'seed', 'pieces', 'lines', 'score', 'level', 'topped_out', 'seconds', 'decision_ms')
+
+_worker_ai = None
+
+
+def _init_worker(weights):
+    global _worker_ai
+    _worker_ai = TetrisAI(weights)
+
+
+def play_game(game, seed, placement_mode, starting_level, goal_type, max_pieces):
+    start = time.perf_counter()
+    state = TetrisState(placement_mode, starting_level, goal_type, seed)
+    state.start()
+    pieces = 0
+    deciding = 0
+    while not state.game_over and pieces < max_pieces:
+        _worker_ai.play_turn(state)
+        deciding += _worker_ai.elapsed
+        pieces += 1
+    return {
+        'game': game,
+        'seed': seed,
+        'pieces': pieces,
+        'lines': state.lines_cleared,
+        'score': state.score,
+        'level': state.level,
+        'topped_out': state.game_over,
+        'seconds': round(time.perf_counter() - start, 4),
+        'decision_ms': round(deciding / max(1, pieces) * 1000, 3)
+    }
+
+
+def run_self_play(games, workers, seed, placement_mode, starting_level, goal_type, max_pieces, weights, output, output_format):
+    context = multiprocessing.get_context('spawn')
+    if output_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=FIELDS)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        write = lambda result: output.write(json.dumps(result) + '\n')
+    totals = {'pieces': 0, 'lines': 0, 'score': 0}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(weights,)) as executor:
+        futures = [
+            executor.submit(play_game, game, seed + game, placement_mode, starting_level, goal_type, max_pieces)
+            for game in range(games)
+        ]
+        # Results are written as games finish, so they are not in game order.
+        for future in as_completed(futures):
+            result = future.result()
+            write(result)
+            output.flush()
+            for key in totals:
+                totals[key] += result[key]
+    elapsed = time.perf_counter() - start
+    print(
+        f'{games} games on {workers} workers in {elapsed:.2f}s: '
+        f'{games / elapsed:.2f} games/s, {games / elapsed / workers:.2f} games/s/core, '
+        f'{totals["pieces"] / elapsed:.0f} pieces/s',
+        file=sys.stderr
+    )
+    print(
+        f'mean per game: {totals["pieces"] / games:.1f} pieces, {totals["lines"] / games:.1f} lines, {totals["score"] / games:.0f} score',
+        file=sys.stderr
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play seeded headless Tetris games with the bot over a process pool and record the results.')
+    parser.add_argument('-n', '--games', type=int, default=100, help='number of games to play (default: 100)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='worker processes (default: one per core)')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='seed of the first game, later games count up from it (default: 0)')
+    parser.add_argument('-l', '--level', type=int, default=1, help='starting level (default: 1)')
+    parser.add_argument('--goal', choices=[goal.name for goal in GoalType], default=GoalType.VARIABLE.name, help='goal type (default: VARIABLE)')
+    parser.add_argument('--placement', choices=[mode.name for mode in PlacementType], default=PlacementType.EXTENDED.name, help='placement mode (default: EXTENDED)')
+    parser.add_argument('-p', '--pieces', type=int, default=1000, help='pieces per game before stopping it (default: 1000)')
+    parser.add_argument('--weights', type=json.loads, default=None, help='JSON object of TetrisAI weights to override')
+    parser.add_argument('-o', '--output', default='-', help='file to write results to, - for stdout (default: -)')
+    parser.add_argument('-f', '--format', choices=['jsonl', 'csv'], default=None, help='output format (default: from the file extension, else jsonl)')
+    args = parser.parse_args()
+    output_format = args.format or ('csv' if args.output.endswith('.csv') else 'jsonl')
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        run_self_play(
+            args.games, args.workers, args.seed, PlacementType[args.placement], args.level,
+            GoalType[args.goal], args.pieces, args.weights, output, output_format
+        )
+    finally:
+        if output is not sys.stdout:
+            output.close()
@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from PIL import Image, ImageDraw, ImageFont, ImageTk
+from Assets import asset_path
+
+
+TEXT_FONT = asset_path('fonts/Rubik-Medium.ttf')
+SYMBOL_FONT = asset_path('fonts/Symbola.ttf')
+
+
+class TextRenderer:
+    CAPACITY = 256
+    DIGITS = '0123456789'
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.fonts = {}
+        # Least recently used first. Evicted images stay alive for as long as a widget
+        # showing them keeps a reference, so callers must hold on to what they display.
+        self.images = OrderedDict()
+        self.pinned = {}
+        self.glyphs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_font(self, path, size):
+        font = self.fonts.get((path, size))
+        if font is None:
+            font = ImageFont.truetype(path, size)
+            self.fonts[path, size] = font
+        return font
+
+    def render(self, text, font, fill=None, background=(0, 0, 0, 0), crop=True):
+        size = font.getbbox(text)
+        text_img = Image.new('RGBA', (size[2], size[3]), background)
+        d = ImageDraw.Draw(text_img, 'RGBA')
+        d.text((0, 0), text, font=font, fill=fill)
+        if crop:
+            text_img = text_img.crop(text_img.getbbox())
+        return text_img
+
+    def get_glyph(self, digit, font, fill, background):
+        key = digit, font, fill, background
+        glyph = self.glyphs.get(key)
+        if glyph is None:
+            # Every digit gets the same height so they line up when laid side by side.
+            height = font.getbbox(TextRenderer.DIGITS)[3]
+            glyph = Image.new('RGBA', (round(font.getlength(digit)), height), background)
+            d = ImageDraw.Draw(glyph, 'RGBA')
+            d.text((0, 0), digit, font=font, fill=fill)
+            self.glyphs[key] = glyph
+        return glyph
+
+    def render_number(self, text, font, fill=None, background=(0, 0, 0, 0), crop=True):
+        glyphs = [self.get_glyph(digit, font, fill, background) for digit in text]
+        strip = Image.new('RGBA', (sum(glyph.width for glyph in glyphs), glyphs[0].height), background)
+        x = 0
+        for glyph in glyphs:
+            strip.paste(glyph, (x, 0))
+            x += glyph.width
+        if crop:
+            strip = strip.crop(strip.getbbox())
+        return strip
+
+    def get(self, text, path, size, fill=None, background=(0, 0, 0, 0), crop=True, pin=False):
+        key = text, path, size, fill, background, crop
+        text_tk = self.pinned.get(key)
+        if text_tk is None:
+            text_tk = self.images.get(key)
+            if text_tk is not None:
+                self.images.move_to_end(key)
+                if pin:
+                    self.pinned[key] = self.images.pop(key)
+        if text_tk is not None:
+            self.hits += 1
+            return text_tk
+        self.misses += 1
+        font = self.get_font(path, size)
+        if text.isdigit() and text.isascii():
+            text_img = self.render_number(text, font, fill, background, crop)
+        else:
+            text_img = self.render(text, font, fill, background, crop)
+        text_tk = ImageTk.PhotoImage(text_img)
+        if pin:
+            self.pinned[key] = text_tk
+        else:
+            self.images[key] = text_tk
+            if len(self.images) > self.capacity:
+                self.images.popitem(last=False)
+        return text_tk
+
+
+text_renderer = TextRenderer()
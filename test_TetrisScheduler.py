@@ -0,0 +1,46 @@
+from TetrisEngine import TetrisState, TetrisScheduler
+
+
+def started_scheduler():
+    state = TetrisState(starting_level=1, seed=0)
+    scheduler = TetrisScheduler(state, clock=lambda: 0)
+    scheduler.start()
+    scheduler.advance(0)
+    return state, scheduler
+
+
+def falling_row(state):
+    return state.falling_tetrimino.upper_left_coords[1]
+
+
+def test_short_stall_is_caught_up_in_full():
+    state, scheduler = started_scheduler()
+    row = falling_row(state)
+    # Six 200ms stalls: each is under the cap, so all 1.2s are played and gravity (1000ms a row at
+    # level 1) moves the piece once.
+    for step in range(1, 7):
+        scheduler.advance(step * 0.2)
+    assert scheduler.ticks == 1200 // TetrisScheduler.TICK_MS
+    assert scheduler.dilated_ms == 0
+    assert falling_row(state) == row + 1
+
+
+def test_long_stall_only_catches_up_the_cap():
+    state, scheduler = started_scheduler()
+    row = falling_row(state)
+    scheduler.advance(3)
+    assert scheduler.ticks == TetrisScheduler.MAX_CATCH_UP_MS // TetrisScheduler.TICK_MS
+    assert scheduler.dilated_ms == 3000 - TetrisScheduler.MAX_CATCH_UP_MS
+    # Three gravity intervals of wall time went by, but the piece has not fallen: time was dilated.
+    assert falling_row(state) == row
+
+
+def test_stalls_are_dilated_the_same_for_both_boards():
+    boards = [started_scheduler() for _ in range(2)]
+    for now in (0.1, 2.5, 2.6, 6):
+        for _, scheduler in boards:
+            scheduler.advance(now)
+    (white, white_scheduler), (black, black_scheduler) = boards
+    assert white_scheduler.ticks == black_scheduler.ticks
+    assert white_scheduler.dilated_ms == black_scheduler.dilated_ms
+    assert falling_row(white) == falling_row(black)
@@ -0,0 +1,13 @@
+from TetrisEngine import Action, Event, TetrisState
+
+
+def test_garbage_topping_out_spawns_nothing():
+    state = TetrisState(seed=0)
+    state.start()
+    # A mino in the top row: any garbage at all pushes it out of the board.
+    state.board[0] = 1
+    state.queue_garbage(2)
+    events = state.step((Action.HARD_DROP,))
+    assert state.game_over
+    assert state.falling_tetrimino is None
+    assert Event.SPAWNED not in [event for event, _ in events]